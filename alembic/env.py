@@ -0,0 +1,29 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+from app import models  # noqa: F401  (registers the tables on Base.metadata)
+from app.database import DATABASE_URL, Base, connect_args
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_online():
+    url = config.get_main_option("sqlalchemy.url") or DATABASE_URL
+    engine = create_engine(url, connect_args=connect_args if url.startswith("sqlite") else {})
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata,
+                          render_as_batch=connection.dialect.name == "sqlite")
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    # revisions inspect the live schema and backfill rows, so there's no SQL script to emit
+    raise SystemExit("offline (--sql) migrations are not supported")
+run_migrations_online()
@@ -0,0 +1,136 @@
+"""reservations, per-ticker seqs and instrument limits
+
+Brings a database created by the original create_all up to the current
+models: Balance.reserved, Order.seq, Transaction.seq and the Instrument
+trading limits. Tables that did not exist yet (sequences, outbox_events,
+outbox_checkpoints) are created from the models. Every step checks the live
+schema first, so this is also safe on a database the new code has already
+touched, or on an empty one.
+
+Backfills:
+- reserved: from reserves.expected_reserved (what the open orders lock). The
+  old code already took the reservation out of `amount`, so only `reserved`
+  is set.
+- Order.seq: open orders only, per ticker in timestamp order (then id, as
+  SQLite timestamps are whole seconds). Closed orders keep NULL.
+- Transaction.seq: every trade, per ticker in timestamp order.
+- the order:<ticker> / trade:<ticker> counters are moved up to the highest seq
+  given out, so new numbers don't collide on the unique indexes.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from collections import defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app import models, reserves
+from app.bulk import OPEN_STATUSES
+from app.database import Base
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = {
+    "instruments": [
+        sa.Column("tick_size", sa.Integer(), nullable=False, server_default="1"),
+        sa.Column("lot_size", sa.Integer(), nullable=False, server_default="1"),
+        sa.Column("min_qty", sa.Integer(), nullable=False, server_default="1"),
+        sa.Column("max_qty", sa.Integer(), nullable=True),
+        sa.Column("price_band_pct", sa.Integer(), nullable=True),
+        sa.Column("halted", sa.Boolean(), nullable=False, server_default=sa.false()),
+    ],
+    "balances": [
+        sa.Column("reserved", sa.Integer(), nullable=False, server_default="0"),
+    ],
+    "orders": [
+        sa.Column("seq", sa.Integer(), nullable=True),
+    ],
+    "transactions": [
+        sa.Column("seq", sa.Integer(), nullable=True),
+    ],
+}
+
+# created after the backfill: the unique ones need the seqs in place
+NEW_INDEXES = [
+    ("ix_orders_book", "orders", ["ticker", "direction", "status", "price", "seq"], False),
+    ("ix_orders_ticker_seq", "orders", ["ticker", "seq"], True),
+    ("ix_transactions_ticker_seq", "transactions", ["ticker", "seq"], True),
+]
+
+
+def _number(db: Session, model, rows, counter: str) -> None:
+    """Give rows (already sorted by ticker, then time) seqs after each ticker's highest."""
+    top = dict(
+        db.query(model.ticker, sa.func.max(model.seq)).filter(model.seq.isnot(None)).group_by(model.ticker)
+    )
+    for row in rows:
+        top[row.ticker] = (top.get(row.ticker) or 0) + 1
+        row.seq = top[row.ticker]
+    db.flush()
+    for ticker, value in top.items():
+        name = f"{counter}:{ticker}"
+        current = db.get(models.Sequence, name)
+        if current is None:
+            db.add(models.Sequence(name=name, value=value))
+        elif current.value < value:
+            current.value = value
+
+
+def _backfill_reserved(db: Session) -> None:
+    balances = defaultdict(list)
+    for b in db.query(models.Balance):
+        balances[(b.user_id, b.ticker)].append(b)
+    for (user_id, ticker), amount in reserves.expected_reserved(db).items():
+        rows = balances.get((user_id, ticker))
+        if rows:
+            rows[0].reserved = amount
+        else:
+            db.add(models.Balance(user_id=user_id, ticker=ticker, amount=0, reserved=amount))
+
+
+def upgrade():
+    bind = op.get_bind()
+    Base.metadata.create_all(bind=bind)  # only creates the tables that are missing
+    inspector = sa.inspect(bind)
+
+    for table, columns in NEW_COLUMNS.items():
+        existing = {c["name"] for c in inspector.get_columns(table)}
+        missing = [c for c in columns if c.name not in existing]
+        if missing:
+            with op.batch_alter_table(table) as batch:
+                for column in missing:
+                    batch.add_column(column)
+
+    db = Session(bind=bind)
+    _backfill_reserved(db)
+    _number(db, models.Order, (
+        db.query(models.Order)
+        .filter(models.Order.status.in_(OPEN_STATUSES), models.Order.seq.is_(None))
+        .order_by(models.Order.ticker, models.Order.timestamp, models.Order.id)
+    ), "order")
+    _number(db, models.Transaction, (
+        db.query(models.Transaction)
+        .filter(models.Transaction.seq.is_(None))
+        .order_by(models.Transaction.ticker, models.Transaction.timestamp, models.Transaction.id)
+    ), "trade")
+    db.flush()
+    db.close()  # the rows stay in alembic's transaction, which commits them
+
+    for name, table, columns, unique in NEW_INDEXES:
+        if name not in {i["name"] for i in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    for name, table, _, _ in reversed(NEW_INDEXES):
+        op.drop_index(name, table_name=table)
+    for table, columns in NEW_COLUMNS.items():
+        with op.batch_alter_table(table) as batch:
+            for column in columns:
+                batch.drop_column(column.name)
@@ -0,0 +1,125 @@
+# app/analytics.py
+"""
+Per-ticker trade analytics computed with NumPy.
+
+Trades are streamed from the database in chunks and folded into a
+volume-at-price profile (distinct price -> volume, trade count). Prices are
+integers, so that profile is exact and sufficient for VWAP, totals, high/low
+and volume-weighted percentiles, while memory stays bounded by the number of
+distinct prices rather than the number of trades in the window.
+"""
+from datetime import datetime, timezone
+from typing import Optional, Sequence
+
+import numpy as np
+from sqlalchemy import String, literal, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+CHUNK_SIZE = 50_000
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class TradeStats:
+    def __init__(self):
+        self.prices = np.empty(0, dtype=np.int64)
+        self.volumes = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.open: Optional[int] = None
+        self.last: Optional[int] = None
+
+    def add_chunk(self, prices: np.ndarray, amounts: np.ndarray) -> None:
+        """Fold one chunk of trades (in seq order) into the running profile."""
+        if prices.size == 0:
+            return
+        if self.open is None:
+            self.open = int(prices[0])
+        self.last = int(prices[-1])
+        self._merge(prices, amounts, np.ones_like(amounts))
+
+    def _merge(self, prices: np.ndarray, volumes: np.ndarray, counts: np.ndarray) -> None:
+        all_prices = np.concatenate([self.prices, prices])
+        uniq, inverse = np.unique(all_prices, return_inverse=True)
+        self.volumes = np.bincount(inverse, weights=np.concatenate([self.volumes, volumes]), minlength=uniq.size).astype(np.int64)
+        self.counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts]), minlength=uniq.size).astype(np.int64)
+        self.prices = uniq
+
+    def profile(self, bucket: int = 1):
+        """Volume-at-price, with prices floored to multiples of `bucket`."""
+        if bucket <= 1:
+            return self.prices, self.volumes, self.counts
+        floored = (self.prices // bucket) * bucket
+        uniq, inverse = np.unique(floored, return_inverse=True)
+        return (
+            uniq,
+            np.bincount(inverse, weights=self.volumes, minlength=uniq.size).astype(np.int64),
+            np.bincount(inverse, weights=self.counts, minlength=uniq.size).astype(np.int64),
+        )
+
+    def percentiles(self, qs: Sequence[float] = PERCENTILES) -> dict:
+        """Volume-weighted price percentiles (lowest price covering q% of volume)."""
+        cum = np.cumsum(self.volumes)
+        idx = np.searchsorted(cum, np.asarray(qs, dtype=np.float64) / 100.0 * cum[-1], side="left")
+        idx = np.minimum(idx, self.prices.size - 1)
+        return {f"p{q:g}": int(self.prices[i]) for q, i in zip(qs, idx)}
+
+    def result(self, bucket: int = 1) -> dict:
+        volume = int(self.volumes.sum())
+        if volume == 0:
+            return {"trades": 0, "volume": 0, "notional": 0, "vwap": None, "open": None,
+                    "high": None, "low": None, "last": None, "percentiles": {}, "volume_profile": []}
+        notional = int(np.dot(self.prices, self.volumes))
+        prices, volumes, counts = self.profile(bucket)
+        return {
+            "trades": int(self.counts.sum()),
+            "volume": volume,
+            "notional": notional,
+            "vwap": notional / volume,
+            "open": self.open,
+            "high": int(self.prices[-1]),
+            "low": int(self.prices[0]),
+            "last": self.last,
+            "percentiles": self.percentiles(),
+            "volume_profile": [
+                {"price": int(p), "volume": int(v), "trades": int(c)}
+                for p, v, c in zip(prices, volumes, counts)
+            ],
+        }
+
+
+def _ts_bound(db: Session, ts: datetime):
+    """
+    A timestamp bound that compares like the stored values. SQLite keeps
+    server-default timestamps as UTC 'YYYY-MM-DD HH:MM:SS' text and compares
+    them as strings, where 'X' < 'X.000000'; a bound with no sub-second part is
+    rendered the same way so that [start, end) holds at whole seconds too.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return ts
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return literal(ts.isoformat(" ", "microseconds" if ts.microsecond else "seconds"), String)
+
+
+def trade_analytics(
+    db: Session,
+    ticker: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: int = 1,
+    chunk_size: int = CHUNK_SIZE,
+) -> dict:
+    stmt = select(models.Transaction.price, models.Transaction.amount).where(models.Transaction.ticker == ticker)
+    if start is not None:
+        stmt = stmt.where(models.Transaction.timestamp >= _ts_bound(db, start))
+    if end is not None:
+        stmt = stmt.where(models.Transaction.timestamp < _ts_bound(db, end))
+    stmt = stmt.order_by(models.Transaction.seq)
+
+    stats = TradeStats()
+    result = db.execute(stmt.execution_options(yield_per=chunk_size))
+    for rows in result.partitions():
+        cols = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        stats.add_chunk(cols[:, 0], cols[:, 1])
+    return {"ticker": ticker, "start": start, "end": end, "bucket": bucket, **stats.result(bucket)}
@@ -0,0 +1,310 @@
+# app/bulk.py
+"""
+Bulk admin operations: balance funding and user provisioning.
+
+Rows are processed in chunks, one transaction per chunk. Within a chunk the
+target users are validated with a single IN query, existing balance rows are
+fetched (and locked) with a single query, and changes are applied with one
+executemany UPDATE (atomic `amount = amount + delta`) plus one executemany
+INSERT for missing rows. Each input row gets its own result entry; an invalid
+row never blocks the rest of its chunk.
+"""
+import codecs
+import csv
+import logging
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import models, outbox
+from .sequences import order_seq
+
+logger = logging.getLogger(__name__)
+
+CASH_TICKER = "RUB"
+OPEN_STATUSES = (models.OrderStatus.NEW, models.OrderStatus.PARTIALLY_EXECUTED)
+
+CHUNK_SIZE = 500
+
+BALANCE_FIELDS = ("user_id", "ticker", "amount")
+USER_FIELDS = ("name",)
+
+
+async def iter_row_chunks(request: Request, required: Tuple[str, ...], chunk_size: int = CHUNK_SIZE) -> AsyncIterator[List[dict]]:
+    """
+    Yield lists of row dicts from either a JSON array body or a CSV body
+    (Content-Type: text/csv, header row required). CSV is parsed as it
+    streams in, so large uploads are never held in memory at once.
+    """
+    ctype = request.headers.get("content-type", "")
+    if "csv" not in ctype:
+        try:
+            rows = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or text/csv")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array")
+        for i in range(0, len(rows), chunk_size):
+            yield rows[i:i + chunk_size]
+        return
+
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()  # spreadsheet exports start with a BOM
+    header = None
+    pending = ""
+    chunk: List[dict] = []
+
+    def _parse(lines: List[str]):
+        nonlocal header
+        for rec in csv.reader(lines):
+            if not rec or not any(c.strip() for c in rec):
+                continue
+            if header is None:
+                header = [c.strip() for c in rec]
+                missing = [f for f in required if f not in header]
+                if missing:
+                    raise HTTPException(status_code=400, detail=f"CSV header missing columns: {', '.join(missing)}")
+                continue
+            chunk.append({k: v.strip() for k, v in zip(header, rec)})
+
+    async for data in request.stream():
+        pending += decoder.decode(data)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        _parse(lines)
+        while len(chunk) >= chunk_size:
+            yield chunk[:chunk_size]
+            del chunk[:chunk_size]
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        _parse([pending])
+    if chunk:
+        yield chunk
+
+
+def summarize(results: List[dict]) -> dict:
+    applied = sum(1 for r in results if r["status"] == "ok")
+    return {"total": len(results), "applied": applied, "failed": len(results) - applied, "results": results}
+
+
+def apply_balance_deltas(
+    db: Session,
+    deltas: Dict[Tuple[str, str], int],
+    existing: Optional[Dict[Tuple[str, str], models.Balance]] = None,
+    release_reserved: bool = False,
+) -> None:
+    """
+    Add delta to each (user_id, ticker) balance with one executemany UPDATE and
+    one executemany INSERT for rows that don't exist yet. Caller commits.
+    `existing` may be passed if the caller already loaded the balance rows.
+    With `release_reserved`, the same delta is taken out of `reserved`
+    (refunding a reservation back to available).
+    """
+    deltas = {k: d for k, d in deltas.items() if d}
+    if not deltas:
+        return
+    if existing is None:
+        existing = {}
+        q = db.query(models.Balance).filter(
+            models.Balance.user_id.in_({k[0] for k in deltas}),
+            models.Balance.ticker.in_({k[1] for k in deltas}),
+        )
+        for b in q:
+            existing.setdefault((b.user_id, b.ticker), b)
+
+    table = models.Balance.__table__
+    updates = [{"b_id": existing[k].id, "delta": d} for k, d in deltas.items() if k in existing]
+    inserts = [
+        {"id": str(uuid.uuid4()), "user_id": k[0], "ticker": k[1], "amount": d,
+         "reserved": -d if release_reserved else 0}
+        for k, d in deltas.items() if k not in existing
+    ]
+    if updates:
+        values = {"amount": table.c.amount + bindparam("delta")}
+        if release_reserved:
+            values["reserved"] = table.c.reserved - bindparam("delta")
+        stmt = update(table).where(table.c.id == bindparam("b_id")).values(**values)
+        db.execute(stmt, updates)
+    if inserts:
+        db.execute(insert(table), inserts)
+
+
+def apply_balance_chunk(db: Session, rows: List[dict], offset: int, withdraw: bool) -> List[dict]:
+    """Validate and apply one chunk of deposit/withdraw rows in a single transaction."""
+    results: List[dict] = [None] * len(rows)
+    parsed: List[Tuple[int, str, str, int]] = []
+    for i, row in enumerate(rows):
+        try:
+            user_id = str(row["user_id"])
+            ticker = str(row["ticker"])
+            amount = int(row["amount"])
+        except (KeyError, TypeError, ValueError):
+            results[i] = {"row": offset + i, "status": "error", "detail": "Invalid row"}
+            continue
+        if amount <= 0:
+            results[i] = {"row": offset + i, "status": "error", "detail": "Amount must be positive"}
+            continue
+        parsed.append((i, user_id, ticker, amount))
+
+    user_ids = {p[1] for p in parsed}
+    known = set()
+    if user_ids:
+        known = {uid for (uid,) in db.query(models.User.id).filter(models.User.id.in_(user_ids))}
+
+    valid = []
+    for i, user_id, ticker, amount in parsed:
+        if user_id not in known:
+            results[i] = {"row": offset + i, "status": "error", "detail": "User not found"}
+        else:
+            valid.append((i, user_id, ticker, amount))
+
+    try:
+        existing: Dict[Tuple[str, str], models.Balance] = {}
+        if valid:
+            q = db.query(models.Balance).filter(
+                models.Balance.user_id.in_({v[1] for v in valid}),
+                models.Balance.ticker.in_({v[2] for v in valid}),
+            )
+            if withdraw:
+                q = q.with_for_update()
+            for b in q:
+                existing.setdefault((b.user_id, b.ticker), b)
+
+        # net delta per (user, ticker); withdrawals are checked cumulatively
+        deltas: Dict[Tuple[str, str], int] = {}
+        for i, user_id, ticker, amount in valid:
+            key = (user_id, ticker)
+            if withdraw:
+                bal = existing.get(key)
+                available = (bal.amount if bal else 0) - deltas.get(key, 0)
+                if available < amount:
+                    results[i] = {"row": offset + i, "status": "error", "detail": "Insufficient funds"}
+                    continue
+            deltas[key] = deltas.get(key, 0) + amount
+            results[i] = {"row": offset + i, "status": "ok"}
+
+        sign = -1 if withdraw else 1
+        apply_balance_deltas(db, {k: sign * d for k, d in deltas.items()}, existing)
+        outbox.emit_many(db, "balance.adjusted", [
+            {"user_id": k[0], "ticker": k[1], "delta": sign * d} for k, d in deltas.items()
+        ])
+        db.commit()
+    except SQLAlchemyError:
+        logger.exception("bulk %s chunk at row %d failed; rolled back", "withdraw" if withdraw else "deposit", offset)
+        db.rollback()
+        for i, *_ in valid:
+            results[i] = {"row": offset + i, "status": "error", "detail": "Chunk failed; not applied"}
+    return results
+
+
+def provision_users_chunk(db: Session, rows: List[dict], offset: int, initial_rub: int) -> List[dict]:
+    """Create one chunk of users plus their starting RUB balance in a single transaction."""
+    results: List[dict] = [None] * len(rows)
+    users = []
+    balances = []
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            results[i] = {"row": offset + i, "status": "error", "detail": "Invalid row"}
+            continue
+        name = str(row.get("name") or "").strip()
+        role = row.get("role") or "USER"
+        if len(name) < 3:
+            results[i] = {"row": offset + i, "status": "error", "detail": "name must be at least 3 characters"}
+            continue
+        try:
+            role = models.UserRole(str(role).upper())
+        except ValueError:
+            results[i] = {"row": offset + i, "status": "error", "detail": "Invalid role"}
+            continue
+        user_id = str(uuid.uuid4())
+        api_key = f"key-{uuid.uuid4()}"
+        users.append({"id": user_id, "name": name, "role": role, "api_key": api_key})
+        balances.append({"id": str(uuid.uuid4()), "user_id": user_id, "ticker": CASH_TICKER, "amount": initial_rub, "reserved": 0})
+        results[i] = {"row": offset + i, "status": "ok", "id": user_id, "name": name, "role": role.value, "api_key": api_key}
+
+    if users:
+        try:
+            db.execute(insert(models.User), users)
+            outbox.emit_many(db, "user.created", [
+                {"user_id": u["id"], "name": u["name"], "role": u["role"].value} for u in users
+            ])
+            if initial_rub:
+                db.execute(insert(models.Balance), balances)
+                outbox.emit_many(db, "balance.adjusted", [
+                    {"user_id": b["user_id"], "ticker": CASH_TICKER, "delta": initial_rub} for b in balances
+                ])
+            db.commit()
+        except SQLAlchemyError:
+            logger.exception("bulk user chunk at row %d failed; rolled back", offset)
+            db.rollback()
+            for i, r in enumerate(results):
+                if r["status"] == "ok":
+                    results[i] = {"row": offset + i, "status": "error", "detail": "Chunk failed; not applied"}
+    return results
+
+
+def cancel_open_orders(db: Session, ticker: str) -> dict:
+    """
+    Cancel every open order on `ticker` and refund its unfilled reservation
+    (RUB for BUY LIMIT, shares for SELL), mirroring cancel_order.
+
+    One UPDATE ... RETURNING flips the orders, refunds are summed per
+    (user, ticker) and applied with apply_balance_deltas, and the
+    order.cancelled events go to the outbox in one executemany INSERT.
+    Caller commits.
+
+    The ticker's order_seq counter is bumped first: that waits for orders
+    being placed on it to commit (so they are cancelled too) and holds
+    back new ones until the caller commits, by which time they see the
+    halt or delist (instruments.check_tradable).
+    """
+    order_seq(db, ticker)
+    table = models.Order.__table__
+    cancelled = db.execute(
+        update(table)
+        .where(table.c.ticker == ticker, table.c.status.in_(OPEN_STATUSES))
+        .values(status=models.OrderStatus.CANCELLED)
+        .returning(
+            table.c.id, table.c.user_id, table.c.type, table.c.direction,
+            table.c.qty, table.c.price, table.c.filled, table.c.seq,
+        )
+    ).all()
+
+    refunds: Dict[Tuple[str, str], int] = {}
+    events = []
+    for o in cancelled:
+        unfilled = o.qty - (o.filled or 0)
+        if unfilled > 0:
+            if o.direction == models.Direction.BUY:
+                if o.price:
+                    key = (o.user_id, CASH_TICKER)
+                    refunds[key] = refunds.get(key, 0) + unfilled * o.price
+            else:
+                key = (o.user_id, ticker)
+                refunds[key] = refunds.get(key, 0) + unfilled
+        events.append({
+            "order_id": o.id,
+            "seq": o.seq,
+            "user_id": o.user_id,
+            "ticker": ticker,
+            "type": o.type.value,
+            "direction": o.direction.value,
+            "qty": o.qty,
+            "price": o.price,
+            "filled": o.filled,
+            "status": models.OrderStatus.CANCELLED.value,
+        })
+
+    apply_balance_deltas(db, refunds, release_reserved=True)
+    outbox.emit_many(db, "order.cancelled", events)
+    # the session may hold stale Order objects from before the UPDATE
+    db.expire_all()
+    return {
+        "ticker": ticker,
+        "cancelled_orders": len(cancelled),
+        "refunded_rub": sum(v for (_, t), v in refunds.items() if t == CASH_TICKER),
+        "refunded_qty": sum(v for (_, t), v in refunds.items() if t != CASH_TICKER),
+    }
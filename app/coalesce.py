@@ -0,0 +1,109 @@
+# app/coalesce.py
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one in-flight computation:
+the first caller (the "leader") runs the function, everyone else arriving
+while it runs waits for and receives the same result (or exception).
+Nothing is cached once the leader finishes — the next call runs again.
+
+Works for sync handlers (threads, FastAPI runs `def` endpoints in a
+threadpool) via `do()` and for async handlers via `ado()`.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, asyncio.Future] = {}
+        self._executed = 0
+        self._coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn() once for all concurrent callers with the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._executed += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of do(): every caller awaits one shared task."""
+        with self._lock:
+            task = self._async_calls.get(key)
+            if task is not None:
+                self._coalesced += 1
+            else:
+                task = asyncio.ensure_future(fn())
+                self._async_calls[key] = task
+                self._executed += 1
+                task.add_done_callback(lambda t: self._async_done(key, t))
+
+        # fn() runs in its own task and every caller (the one that started
+        # it included) awaits it through a shield, so a cancelled caller
+        # never cancels the computation the others are waiting on
+        return await asyncio.shield(task)
+
+    def _async_done(self, key: Hashable, task: asyncio.Future) -> None:
+        with self._lock:
+            if self._async_calls.get(key) is task:
+                del self._async_calls[key]
+        if not task.cancelled():
+            # mark retrieved so a failure nobody awaited doesn't log a warning
+            task.exception()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._executed + self._coalesced
+            return {
+                "executed": self._executed,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._calls) + len(self._async_calls),
+                "coalesce_ratio": (self._coalesced / total) if total else 0.0,
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._executed = 0
+            self._coalesced = 0
+
+
+# shared instance for market-data reads
+market_data_flight = SingleFlight()
@@ -1,6 +1,9 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from contextvars import ContextVar
+from typing import Optional
 import os
+import time
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -16,9 +19,52 @@ SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 Base = declarative_base()
 
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+class SqlStats:
+    """SQL statement count and timings for one request (see main.py middleware)."""
+    KEEP_SLOWEST = 5
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = []  # (seconds, statement), longest first
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.total += elapsed
+        if len(self.slowest) < self.KEEP_SLOWEST or elapsed > self.slowest[-1][0]:
+            self.slowest.append((elapsed, statement))
+            self.slowest.sort(key=lambda x: x[0], reverse=True)
+            del self.slowest[self.KEEP_SLOWEST:]
+
+
+# set per request; statements run outside a request are not recorded
+sql_stats: ContextVar[Optional[SqlStats]] = ContextVar("sql_stats", default=None)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start_time"].pop()
+    stats = sql_stats.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - start)
+
+
+@event.listens_for(engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start_time"):
+        conn.info["query_start_time"].pop()
@@ -0,0 +1,164 @@
+# app/encoding.py
+"""
+Content negotiation for market-data responses.
+
+Accept: application/msgpack
+    Same structure as the JSON body, msgpack-encoded; datetimes become
+    msgpack Timestamp extensions instead of ISO strings.
+Accept: application/x-toy-packed
+    Fixed-layout little-endian integers, no keys (see PACKERS below):
+      orderbook:     u32 n_bids, u32 n_asks, then (i64 price, i64 qty) per bid, per ask
+      transactions:  u32 n, then (i64 seq, i64 price, i64 amount, i64 ts_ms) per trade
+    Endpoints without a packer answer with JSON.
+anything else
+    JSON.
+
+Bodies of at least COMPRESS_MIN_BYTES are gzip- or deflate-compressed when
+the client's Accept-Encoding allows it.
+"""
+import gzip
+import json
+import os
+import struct
+import zlib
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+from fastapi import Request, Response
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; clients asking for it get JSON
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+PACKED = "application/x-toy-packed"
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+
+
+def _ts_ms(ts) -> int:
+    if ts is None:
+        return 0
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+
+def pack_orderbook(book: dict) -> bytes:
+    bids, asks = book["bid_levels"], book["ask_levels"]
+    flat = [v for lvl in bids for v in (lvl["price"], lvl["qty"])]
+    flat += [v for lvl in asks for v in (lvl["price"], lvl["qty"])]
+    return struct.pack(f"<II{len(flat)}q", len(bids), len(asks), *flat)
+
+
+def pack_transactions(txs: list) -> bytes:
+    flat = [v for t in txs for v in (t.get("seq") or 0, t["price"], t["amount"], _ts_ms(t["timestamp"]))]
+    return struct.pack(f"<I{len(flat)}q", len(txs), *flat)
+
+
+PACKERS: Dict[str, Callable[[object], bytes]] = {
+    "orderbook": pack_orderbook,
+    "transactions": pack_transactions,
+}
+
+
+def _json_default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, datetime):
+        return msgpack.Timestamp.from_datetime(obj if obj.tzinfo else obj.replace(tzinfo=timezone.utc))
+    raise TypeError(f"{type(obj).__name__} is not msgpack serializable")
+
+
+def encode_json(data) -> bytes:
+    return json.dumps(data, separators=(",", ":"), default=_json_default).encode()
+
+
+def encode_msgpack(data) -> bytes:
+    return msgpack.packb(data, default=_msgpack_default)
+
+
+def _qvalues(header: str) -> Dict[str, float]:
+    """Parse an Accept-style header into {token: q}; q defaults to 1."""
+    prefs: Dict[str, float] = {}
+    for part in header.lower().split(","):
+        token, *params = (p.strip() for p in part.split(";"))
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        prefs[token] = max(q, prefs.get(token, 0.0))
+    return prefs
+
+
+def negotiate(accept: str, kind: str) -> str:
+    """
+    Pick the media type with the highest q. Binary types must be named
+    explicitly; wildcards (and an empty Accept) only grant JSON. Equal q
+    prefers msgpack, then packed, then JSON. Nothing acceptable falls back
+    to JSON.
+    """
+    prefs = _qvalues(accept)
+    if not prefs:
+        return JSON
+    candidates = [(prefs.get(JSON, prefs.get("application/*", prefs.get("*/*", 0.0))), 0, JSON)]
+    if msgpack is not None:
+        q = max(prefs.get(MSGPACK, 0.0), prefs.get("application/x-msgpack", 0.0))
+        candidates.append((q, 2, MSGPACK))
+    if kind in PACKERS:
+        candidates.append((prefs.get(PACKED, 0.0), 1, PACKED))
+    q, _, media = max(candidates)
+    return media if q > 0 else JSON
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    """gzip, deflate or None (identity), by q; equal q prefers compressing."""
+    prefs = _qvalues(accept_encoding)
+    star = prefs.get("*")
+    candidates = [
+        (prefs.get("gzip", star or 0.0), 2, "gzip"),
+        (prefs.get("deflate", star or 0.0), 1, "deflate"),
+        # unlisted identity is acceptable (unless *;q=0) but the last resort
+        (prefs.get("identity", 0.001 if star is None else star), 0, None),
+    ]
+    q, _, enc = max(candidates, key=lambda c: c[:2])
+    return enc if q > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return zlib.compress(body, 6)
+
+
+def respond(request: Request, data, kind: str) -> Response:
+    """Encode `data` in the best media type and encoding the client accepts."""
+    media = negotiate(request.headers.get("accept", ""), kind)
+    if media == MSGPACK:
+        body = encode_msgpack(data)
+    elif media == PACKED:
+        body = PACKERS[kind](data)
+    else:
+        body = encode_json(data)
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        enc = _choose_encoding(request.headers.get("accept-encoding", ""))
+        if enc:
+            body = compress(body, enc)
+            headers["Content-Encoding"] = enc
+    return Response(content=body, media_type=media, headers=headers)
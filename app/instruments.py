@@ -0,0 +1,176 @@
+# app/instruments.py
+"""
+In-process instrument registry and per-instrument trading state.
+
+The registry mirrors the `instruments` table (tick size, lot size, qty limits,
+price band, halted flag) plus the last trade price per ticker, so order
+validation on the hot path never touches the database. It is loaded at startup
+and refreshed by the admin endpoints. Other worker processes only see a halt
+or delist on their next load, so `check_tradable` re-reads the row inside the
+order transaction.
+"""
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+@dataclass(frozen=True)
+class InstrumentSpec:
+    ticker: str
+    name: str
+    tick_size: int = 1
+    lot_size: int = 1
+    min_qty: int = 1
+    max_qty: Optional[int] = None
+    price_band_pct: Optional[int] = None
+
+    @classmethod
+    def from_model(cls, inst: models.Instrument) -> "InstrumentSpec":
+        return cls(
+            ticker=inst.ticker,
+            name=inst.name,
+            tick_size=inst.tick_size or 1,
+            lot_size=inst.lot_size or 1,
+            min_qty=inst.min_qty or 1,
+            max_qty=inst.max_qty,
+            price_band_pct=inst.price_band_pct,
+        )
+
+
+_lock = threading.Lock()
+_specs: Dict[str, InstrumentSpec] = {}
+_last_price: Dict[str, int] = {}
+_halted = set()
+
+
+def load(db: Session) -> None:
+    """(Re)load every instrument and its last trade price from the database."""
+    insts = db.query(models.Instrument).all()
+    specs = {i.ticker: InstrumentSpec.from_model(i) for i in insts}
+    halted = {i.ticker for i in insts if i.halted}
+    latest = (
+        db.query(models.Transaction.ticker, func.max(models.Transaction.seq).label("seq"))
+        .group_by(models.Transaction.ticker)
+        .subquery()
+    )
+    rows = (
+        db.query(models.Transaction.ticker, models.Transaction.price)
+        .join(latest, (models.Transaction.ticker == latest.c.ticker) & (models.Transaction.seq == latest.c.seq))
+        .all()
+    )
+    global _specs, _last_price, _halted
+    with _lock:
+        _specs = specs
+        _last_price = {t: p for t, p in rows if t in specs}
+        _halted = halted
+
+
+def put(inst: models.Instrument) -> None:
+    with _lock:
+        _specs[inst.ticker] = InstrumentSpec.from_model(inst)
+        if inst.halted:
+            _halted.add(inst.ticker)
+        else:
+            _halted.discard(inst.ticker)
+
+
+def get(ticker: str) -> Optional[InstrumentSpec]:
+    return _specs.get(ticker)
+
+
+def record_trade(ticker: str, price: int) -> None:
+    _last_price[ticker] = price
+
+
+def last_price(ticker: str) -> Optional[int]:
+    return _last_price.get(ticker)
+
+
+def _check_qty(spec: InstrumentSpec, qty: int) -> Optional[str]:
+    if qty % spec.lot_size:
+        return f"qty must be a multiple of lot size {spec.lot_size}"
+    if qty < spec.min_qty:
+        return f"qty below minimum {spec.min_qty}"
+    if spec.max_qty is not None and qty > spec.max_qty:
+        return f"qty above maximum {spec.max_qty}"
+    return None
+
+
+def _check_price(spec: InstrumentSpec, price: int) -> Optional[str]:
+    if price % spec.tick_size:
+        return f"price must be a multiple of tick size {spec.tick_size}"
+    last = _last_price.get(spec.ticker)
+    if spec.price_band_pct is not None and last:
+        band = last * spec.price_band_pct / 100
+        if abs(price - last) > band:
+            return f"price outside {spec.price_band_pct}% band around last trade {last}"
+    return None
+
+
+def validate_order(ticker: str, qty: int, price: Optional[int]) -> Optional[str]:
+    """Return a reason the order can't trade, or None if it passes."""
+    spec = _specs.get(ticker)
+    if spec is None:
+        return f"Unknown instrument {ticker}"
+    if ticker in _halted:
+        return f"Trading in {ticker} is halted"
+    reason = _check_qty(spec, qty)
+    if reason is None and price is not None:
+        reason = _check_price(spec, price)
+    return reason
+
+
+def validate_amend(ticker: str, qty: Optional[int], price: Optional[int]) -> Optional[str]:
+    """
+    Like validate_order, but only for what an amend changes: pass None for
+    an unchanged qty or price. The halt check is left to the caller, since a
+    pure size reduction is allowed even then.
+    """
+    spec = _specs.get(ticker)
+    if spec is None:
+        return f"Unknown instrument {ticker}"
+    reason = _check_qty(spec, qty) if qty is not None else None
+    if reason is None and price is not None:
+        reason = _check_price(spec, price)
+    return reason
+
+
+def check_tradable(db: Session, ticker: str) -> Optional[str]:
+    """
+    Existence/halt check against the database. Call it after taking the
+    ticker's order_seq lock: delist and halt bump the same counter
+    (bulk.cancel_open_orders), so the answer holds until the caller commits.
+    """
+    row = db.query(models.Instrument.halted).filter(models.Instrument.ticker == ticker).first()
+    if row is None:
+        return f"Unknown instrument {ticker}"
+    if row.halted:
+        return f"Trading in {ticker} is halted"
+    return None
+
+
+def halt(ticker: str) -> None:
+    with _lock:
+        _halted.add(ticker)
+
+
+def resume(ticker: str) -> None:
+    with _lock:
+        _halted.discard(ticker)
+
+
+def is_halted(ticker: str) -> bool:
+    return ticker in _halted
+
+
+def drop(ticker: str) -> None:
+    """Forget everything held in memory for a delisted ticker."""
+    with _lock:
+        _specs.pop(ticker, None)
+        _last_price.pop(ticker, None)
+        _halted.discard(ticker)
@@ -1,8 +1,17 @@
 import os
-from fastapi import FastAPI
-from .database import engine, Base, SessionLocal
+import time
+import logging
+from fastapi import FastAPI, Request
+from .database import engine, Base, SessionLocal, SqlStats, sql_stats
 from .routers import public, balance, order, admin
 from . import models
+from . import outbox
+from . import instruments
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "250"))
 
 
 # create DB tables (simple approach)
@@ -17,6 +26,30 @@ app.include_router(order.router)
 app.include_router(admin.router)
 
 
+@app.middleware("http")
+async def slow_request_logger(request: Request, call_next):
+    """Log requests slower than SLOW_REQUEST_MS with their SQL count and timings."""
+    stats = SqlStats()
+    token = sql_stats.set(stats)
+    start = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        sql_stats.reset(token)
+        profiling.request_finished()
+        if elapsed_ms >= SLOW_REQUEST_MS:
+            logger.warning(
+                "slow request %s %s: %.1f ms, %d SQL statements in %.1f ms; slowest: %s",
+                request.method,
+                request.url.path,
+                elapsed_ms,
+                stats.count,
+                stats.total * 1000,
+                "; ".join(f"{t * 1000:.1f} ms {stmt[:200]!r}" for t, stmt in stats.slowest),
+            )
+
+
 @app.get("/")
 def root():
     return {"message": "Toy Exchange API. See /docs for OpenAPI UI."}
@@ -57,3 +90,30 @@ def ensure_admin_exists():
                 print(f"[startup] promoted user {admin.id} to ADMIN")
     finally:
         db.close()
+
+
+@app.on_event("startup")
+def load_instrument_registry():
+    db = SessionLocal()
+    try:
+        instruments.load(db)
+    finally:
+        db.close()
+
+
+_outbox_drainers = []
+
+
+@app.on_event("startup")
+def start_outbox_drainers():
+    """Start one background drainer per sink configured in OUTBOX_SINKS."""
+    for consumer, sink in outbox.sinks_from_env():
+        drainer = outbox.OutboxDrainer(consumer, sink)
+        drainer.start()
+        _outbox_drainers.append(drainer)
+
+
+@app.on_event("shutdown")
+def stop_outbox_drainers():
+    while _outbox_drainers:
+        _outbox_drainers.pop().stop()
@@ -1,9 +1,11 @@
 # app/matching.py
 from sqlalchemy.orm import Session
-from sqlalchemy import asc, desc, and_
+from sqlalchemy import asc, desc, and_, func
 from typing import List
 
 from . import models
+from . import outbox
+from .sequences import trade_seq
 
 CASH_TICKER = "RUB"
 
@@ -11,7 +13,7 @@ CASH_TICKER = "RUB"
 def _get_balance(db: Session, user_id: str, ticker: str) -> models.Balance:
     b = db.query(models.Balance).filter(models.Balance.user_id == user_id, models.Balance.ticker == ticker).with_for_update().first()
     if not b:
-        b = models.Balance(user_id=user_id, ticker=ticker, amount=0)
+        b = models.Balance(user_id=user_id, ticker=ticker, amount=0, reserved=0)
         db.add(b)
         db.flush()
     return b
@@ -23,9 +25,11 @@ def match_order(db: Session, taker: models.Order) -> List[models.Transaction]:
       - For BUY taker: match against lowest price SELL makers.
       - For SELL taker: match against highest price BUY makers.
     Assumptions:
-      - SELL orders reserve ticker qty at creation (their Balance already decremented).
-      - BUY LIMIT orders reserve RUB at creation (their RUB Balance already decremented).
-      - Market orders may not have reserves; if they do not match, leftover remains.
+      - SELL orders reserve ticker qty at creation (moved from amount to reserved).
+      - BUY LIMIT orders reserve price * qty RUB at creation (moved from amount to reserved);
+        each fill releases price * fill_qty and refunds any price improvement.
+      - BUY MARKET orders reserve nothing and pay from available RUB at fill time.
+      - If a market order does not fully match, leftover remains.
     Returns list of created Transaction objects.
     """
     created_trades = []
@@ -44,14 +48,14 @@ def match_order(db: Session, taker: models.Order) -> List[models.Transaction]:
                     models.Order.status == models.OrderStatus.NEW,
                     models.Order.qty - models.Order.filled > 0,
                     models.Order.price <= taker.price
-                ).order_by(asc(models.Order.price), asc(models.Order.timestamp)).with_for_update()
+                ).order_by(asc(models.Order.price), asc(models.Order.seq)).with_for_update()
             else:
                 makers_q = db.query(models.Order).filter(
                     models.Order.ticker == taker.ticker,
                     models.Order.direction == models.Direction.SELL,
                     models.Order.status == models.OrderStatus.NEW,
                     models.Order.qty - models.Order.filled > 0
-                ).order_by(asc(models.Order.price), asc(models.Order.timestamp)).with_for_update()
+                ).order_by(asc(models.Order.price), asc(models.Order.seq)).with_for_update()
         else:  # taker is SELL
             if taker.type == models.OrderType.LIMIT:
                 makers_q = db.query(models.Order).filter(
@@ -60,14 +64,14 @@ def match_order(db: Session, taker: models.Order) -> List[models.Transaction]:
                     models.Order.status == models.OrderStatus.NEW,
                     models.Order.qty - models.Order.filled > 0,
                     models.Order.price >= taker.price
-                ).order_by(desc(models.Order.price), asc(models.Order.timestamp)).with_for_update()
+                ).order_by(desc(models.Order.price), asc(models.Order.seq)).with_for_update()
             else:
                 makers_q = db.query(models.Order).filter(
                     models.Order.ticker == taker.ticker,
                     models.Order.direction == models.Direction.BUY,
                     models.Order.status == models.OrderStatus.NEW,
                     models.Order.qty - models.Order.filled > 0
-                ).order_by(desc(models.Order.price), asc(models.Order.timestamp)).with_for_update()
+                ).order_by(desc(models.Order.price), asc(models.Order.seq)).with_for_update()
 
         maker = makers_q.first()
         if not maker:
@@ -99,16 +103,31 @@ def match_order(db: Session, taker: models.Order) -> List[models.Transaction]:
             buyer_id = maker.user_id
             seller_id = taker.user_id
 
-        total_rub = trade_price * trade_qty
+        buy_order = taker if taker.direction == models.Direction.BUY else maker
 
         # Get / lock balances for both parties
-        # Buyer: increase ticker balance; if buy was reserved (LIMIT), their RUB already deducted on order creation.
         buyer_ticker_balance = _get_balance(db, buyer_id, taker.ticker)
+        buyer_rub_balance = _get_balance(db, buyer_id, CASH_TICKER)
+        seller_ticker_balance = _get_balance(db, seller_id, taker.ticker)
         seller_rub_balance = _get_balance(db, seller_id, CASH_TICKER)
 
-        # If maker was BUY and reserved RUB upfront (for limit buy) we need to capture funds:
-        # For simplicity we assume RUB for limit buys was already reserved when the buy order was placed (we decremented RUB).
-        # For SELL side, at order creation we decremented seller's ticker balance to reserve.
+        if buy_order.price is None:
+            # MARKET buys reserve nothing up front: pay from available RUB,
+            # filling only as much as the buyer can afford.
+            trade_qty = min(trade_qty, buyer_rub_balance.amount // trade_price)
+            if trade_qty <= 0:
+                break
+            buyer_rub_balance.amount -= trade_price * trade_qty
+        else:
+            # LIMIT buys reserved price * qty: release this fill's share of the
+            # reservation and refund any price improvement to available RUB.
+            buyer_rub_balance.reserved -= buy_order.price * trade_qty
+            buyer_rub_balance.amount += (buy_order.price - trade_price) * trade_qty
+
+        total_rub = trade_price * trade_qty
+
+        # SELL orders always reserved their shares at creation
+        seller_ticker_balance.reserved -= trade_qty
 
         # Credit buyer's ticker balance
         buyer_ticker_balance.amount += trade_qty
@@ -129,31 +148,62 @@ def match_order(db: Session, taker: models.Order) -> List[models.Transaction]:
         tx = models.Transaction(
             ticker=taker.ticker,
             amount=trade_qty,
-            price=trade_price
+            price=trade_price,
+            seq=trade_seq(db, taker.ticker),
         )
         db.add(tx)
         # flush so id/timestamp is set
         db.flush()
         created_trades.append(tx)
 
+        outbox.emit(db, "trade", {
+            "trade_id": tx.id,
+            "seq": tx.seq,
+            "ticker": tx.ticker,
+            "qty": trade_qty,
+            "price": trade_price,
+            "buyer_id": buyer_id,
+            "seller_id": seller_id,
+            "taker_order_id": taker.id,
+            "maker_order_id": maker.id,
+        })
+        outbox.emit(db, "order.filled", outbox.order_payload(maker))
+
         # Update remaining for loop
         remaining = taker.qty - taker.filled
 
         # Commit not here — caller will commit; but flush so other queries see updates
         db.flush()
 
-    # If after matching taker still has remaining > 0 and is a BUY LIMIT we should release unspent RUB for leftover qty
-    if taker.direction == models.Direction.BUY and taker.type == models.OrderType.LIMIT:
-        leftover = taker.qty - taker.filled
-        if leftover > 0:
-            # calculate reserved originally: taker.price * taker.qty
-            reserved_total = (taker.price or 0) * taker.qty
-            spent_total = sum((t.price * t.amount) for t in created_trades) if created_trades else 0
-            refund = reserved_total - spent_total
-            if refund > 0:
-                # refund back to taker RUB balance
-                taker_rub = _get_balance(db, taker.user_id, CASH_TICKER)
-                taker_rub.amount += refund
-                db.flush()
+    if created_trades:
+        outbox.emit(db, "order.filled", outbox.order_payload(taker))
 
     return created_trades
+
+
+def get_orderbook_levels(db: Session, ticker: str, limit: int = 10) -> dict:
+    """
+    Aggregate resting LIMIT orders into L2 price levels.
+    Bids sorted high -> low, asks low -> high; at most `limit` levels per side.
+    """
+    def _levels(direction: models.Direction, order) -> list:
+        rows = (
+            db.query(models.Order.price, func.sum(models.Order.qty - models.Order.filled))
+            .filter(
+                models.Order.ticker == ticker,
+                models.Order.direction == direction,
+                models.Order.status == models.OrderStatus.NEW,
+                models.Order.price.isnot(None),
+                models.Order.qty - models.Order.filled > 0,
+            )
+            .group_by(models.Order.price)
+            .order_by(order(models.Order.price))
+            .limit(limit)
+            .all()
+        )
+        return [{"price": int(price), "qty": int(qty)} for price, qty in rows]
+
+    return {
+        "bid_levels": _levels(models.Direction.BUY, desc),
+        "ask_levels": _levels(models.Direction.SELL, asc),
+    }
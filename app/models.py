@@ -1,6 +1,7 @@
 import enum
 import uuid
-from sqlalchemy import Column, String, Integer, DateTime, Enum, JSON, ForeignKey
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Enum, JSON, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -20,13 +21,20 @@ class Instrument(Base):
     __tablename__ = "instruments"
     ticker = Column(String, primary_key=True)
     name = Column(String, nullable=False)
+    tick_size = Column(Integer, nullable=False, default=1)
+    lot_size = Column(Integer, nullable=False, default=1)
+    min_qty = Column(Integer, nullable=False, default=1)
+    max_qty = Column(Integer, nullable=True)
+    price_band_pct = Column(Integer, nullable=True)  # max % away from last trade price
+    halted = Column(Boolean, nullable=False, default=False)
 
 class Balance(Base):
     __tablename__ = "balances"
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"))
     ticker = Column(String)
-    amount = Column(Integer, default=0)
+    amount = Column(Integer, default=0)  # available
+    reserved = Column(Integer, nullable=False, default=0)  # locked by open orders
 
 class OrderStatus(str, enum.Enum):
     NEW = "NEW"
@@ -54,6 +62,12 @@ class Order(Base):
     status = Column(Enum(OrderStatus), default=OrderStatus.NEW)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     filled = Column(Integer, default=0)
+    seq = Column(Integer, nullable=True)  # per-ticker acceptance order, used for time priority
+
+    __table_args__ = (
+        Index("ix_orders_book", "ticker", "direction", "status", "price", "seq"),
+        Index("ix_orders_ticker_seq", "ticker", "seq", unique=True),
+    )
 
 class Transaction(Base):
     __tablename__ = "transactions"
@@ -62,3 +76,34 @@ class Transaction(Base):
     amount = Column(Integer)
     price = Column(Integer)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    seq = Column(Integer, nullable=True)  # per-ticker, gap-free trade cursor
+
+    __table_args__ = (
+        Index("ix_transactions_ticker_seq", "ticker", "seq", unique=True),
+    )
+
+class Sequence(Base):
+    """Named gap-free counters, bumped inside the caller's transaction."""
+    __tablename__ = "sequences"
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class OutboxEvent(Base):
+    """Order/trade events written in the same transaction as the state change."""
+    __tablename__ = "outbox_events"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event_type = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    # set in Python at emit time: func.now() is whole seconds on SQLite
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    position = Column(Integer, nullable=True)  # commit order, assigned at commit (see outbox.py)
+
+    __table_args__ = (
+        Index("ix_outbox_events_position", "position", unique=True),
+    )
+
+class OutboxCheckpoint(Base):
+    """Last outbox position delivered to each consumer."""
+    __tablename__ = "outbox_checkpoints"
+    consumer = Column(String, primary_key=True)
+    last_position = Column(Integer, nullable=False, default=0)
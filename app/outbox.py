@@ -0,0 +1,267 @@
+# app/outbox.py
+"""
+Transactional outbox.
+
+State changes (orders, trades) call `emit()` with the request's session, so the
+event row commits or rolls back together with the change itself. An
+`OutboxDrainer` thread then reads events in `position` order, in batches, hands
+them to a sink and advances a per-consumer checkpoint only after the sink
+accepted the batch. A crash between publish and checkpoint re-delivers the
+batch (at-least-once), so consumers should dedupe on the event `id`.
+
+Autoincrement ids follow insert order, not commit order: on Postgres a
+transaction can take id 10, another take id 11 and commit first, and a
+checkpoint on ids would then skip 10 for good. So `position` is assigned just
+before commit from the gap-free "outbox" counter (see sequences.py); its row
+lock is held until commit, which makes positions follow commit order.
+
+Sinks are configured with OUTBOX_SINKS, a comma-separated list of:
+  - file:<path>         append NDJSON lines to a file
+  - socket:<path>       send NDJSON lines over a local unix socket
+Callback sinks are registered in-process via `CallbackSink`.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+from typing import Callable, List, Optional
+
+from sqlalchemy import bindparam, event, insert, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .sequences import next_seq
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "1000"))
+DEFAULT_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "0.5"))
+
+POSITION_SEQ = "outbox"
+
+
+def emit(db: Session, event_type: str, payload: dict) -> None:
+    """Queue an event in the caller's transaction. Caller commits."""
+    db.add(models.OutboxEvent(event_type=event_type, payload=payload))
+    db.info["outbox_pending"] = True
+
+
+def emit_many(db: Session, event_type: str, payloads: List[dict]) -> None:
+    """Queue many events of one type with a single executemany INSERT."""
+    if payloads:
+        db.execute(
+            insert(models.OutboxEvent),
+            [{"event_type": event_type, "payload": p} for p in payloads],
+        )
+        db.info["outbox_pending"] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _assign_positions(db: Session) -> None:
+    """Number this transaction's events in commit order, right before commit."""
+    if not db.info.pop("outbox_pending", False):
+        return
+    db.flush()
+    # other transactions' uncommitted rows are invisible here, and every
+    # committed row already has a position, so these are exactly ours
+    ids = [i for (i,) in (
+        db.query(models.OutboxEvent.id)
+        .filter(models.OutboxEvent.position.is_(None))
+        .order_by(models.OutboxEvent.id)
+    )]
+    if not ids:
+        return
+    first = next_seq(db, POSITION_SEQ, len(ids)) - len(ids) + 1
+    table = models.OutboxEvent.__table__
+    db.execute(
+        update(table).where(table.c.id == bindparam("e_id")).values(position=bindparam("pos")),
+        [{"e_id": i, "pos": first + n} for n, i in enumerate(ids)],
+    )
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_pending(db: Session) -> None:
+    db.info.pop("outbox_pending", None)
+
+
+def order_payload(o: models.Order) -> dict:
+    return {
+        "order_id": o.id,
+        "seq": o.seq,
+        "user_id": o.user_id,
+        "ticker": o.ticker,
+        "type": o.type.value,
+        "direction": o.direction.value,
+        "qty": o.qty,
+        "price": o.price,
+        "filled": o.filled,
+        "status": o.status.value,
+    }
+
+
+def _event_dict(e: models.OutboxEvent) -> dict:
+    return {
+        "id": e.id,
+        "position": e.position,
+        "type": e.event_type,
+        "created_at": e.created_at.isoformat() if e.created_at else None,
+        "payload": e.payload,
+    }
+
+
+#
+# Sinks: publish(events) must raise if the batch was not accepted.
+#
+
+
+class FileSink:
+    def __init__(self, path: str):
+        self.path = path
+
+    def publish(self, events: List[dict]) -> None:
+        data = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in events)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self) -> None:
+        pass
+
+
+class SocketSink:
+    def __init__(self, path: str):
+        self.path = path
+        self._sock: Optional[socket.socket] = None
+
+    def _connect(self) -> socket.socket:
+        if self._sock is None:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.connect(self.path)
+            self._sock = s
+        return self._sock
+
+    def publish(self, events: List[dict]) -> None:
+        data = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in events).encode()
+        try:
+            self._connect().sendall(data)
+        except OSError:
+            # drop the connection so the next attempt reconnects
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+
+class CallbackSink:
+    def __init__(self, fn: Callable[[List[dict]], None]):
+        self.fn = fn
+
+    def publish(self, events: List[dict]) -> None:
+        self.fn(events)
+
+    def close(self) -> None:
+        pass
+
+
+def sinks_from_env() -> List[tuple]:
+    """Parse OUTBOX_SINKS into (consumer_name, sink) pairs."""
+    spec = os.getenv("OUTBOX_SINKS", "").strip()
+    sinks = []
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        kind, _, target = item.partition(":")
+        if kind == "file":
+            sinks.append((item, FileSink(target)))
+        elif kind == "socket":
+            sinks.append((item, SocketSink(target)))
+        else:
+            raise ValueError(f"Unknown outbox sink: {item}")
+    return sinks
+
+
+#
+# Drainer
+#
+
+
+class OutboxDrainer:
+    def __init__(
+        self,
+        consumer: str,
+        sink,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        session_factory=SessionLocal,
+    ):
+        self.consumer = consumer
+        self.sink = sink
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def drain_once(self) -> int:
+        """Publish the next batch after the checkpoint. Returns events published."""
+        db = self.session_factory()
+        try:
+            cp = db.get(models.OutboxCheckpoint, self.consumer)
+            if cp is None:
+                cp = models.OutboxCheckpoint(consumer=self.consumer, last_position=0)
+                db.add(cp)
+            events = (
+                db.query(models.OutboxEvent)
+                .filter(models.OutboxEvent.position > cp.last_position)
+                .order_by(models.OutboxEvent.position)
+                .limit(self.batch_size)
+                .all()
+            )
+            if not events:
+                db.commit()
+                return 0
+            self.sink.publish([_event_dict(e) for e in events])
+            cp.last_position = events[-1].position
+            db.commit()
+            return len(events)
+        finally:
+            db.close()
+
+    def drain_all(self) -> int:
+        total = 0
+        while True:
+            n = self.drain_once()
+            total += n
+            if n < self.batch_size:
+                return total
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                n = self.drain_once()
+            except Exception:
+                logger.exception("outbox drain failed for %s; will retry", self.consumer)
+                n = 0
+            # keep going without sleeping while there is a backlog
+            if n < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"outbox-{self.consumer}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.sink.close()
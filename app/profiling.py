@@ -0,0 +1,110 @@
+# app/profiling.py
+"""
+On-demand sampling profiler.
+
+A background thread snapshots every other thread's Python stack with
+sys._current_frames() every `interval` seconds. Threads parked in the
+threadpool, the event loop's select or a lock wait are skipped, so samples
+show where requests actually spend time (matching, SQLAlchemy, Pydantic...).
+Output is either collapsed stacks (one "a;b;c count" line per stack, ready
+for flamegraph.pl / speedscope) or a flat self/cumulative table.
+"""
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Optional
+
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+
+def _is_idle(frame) -> bool:
+    return os.path.basename(frame.f_code.co_filename) in _IDLE_FILES
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.requests = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def stats(self, limit: int = 50) -> str:
+        own: Counter = Counter()
+        cumulative: Counter = Counter()
+        total = sum(self.stacks.values())
+        for stack, n in self.stacks.items():
+            funcs = stack.split(";")
+            own[funcs[-1]] += n
+            for f in set(funcs):
+                cumulative[f] += n
+        lines = [
+            f"{total} stack samples over {self.samples} ticks, {self.requests} requests",
+            f"{'self%':>7} {'cum%':>7}  function",
+        ]
+        if not total:
+            return "\n".join(lines) + "\n"
+        for f, n in cumulative.most_common(limit):
+            lines.append(f"{100.0 * own[f] / total:7.2f} {100.0 * n / total:7.2f}  {f}")
+        return "\n".join(lines) + "\n"
+
+
+_lock = threading.Lock()
+_active: Optional[Sampler] = None
+
+
+def begin(interval: float) -> Optional[Sampler]:
+    """Start a profiling session; returns None if one is already running."""
+    global _active
+    with _lock:
+        if _active is not None:
+            return None
+        _active = Sampler(interval)
+    _active.start()
+    return _active
+
+
+def end(sampler: Sampler) -> None:
+    global _active
+    sampler.stop()
+    with _lock:
+        if _active is sampler:
+            _active = None
+
+
+def request_finished() -> None:
+    sampler = _active
+    if sampler is not None:
+        sampler.requests += 1
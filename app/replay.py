@@ -0,0 +1,352 @@
+# app/replay.py
+"""
+Order-tape recording and deterministic replay.
+
+    python -m app.replay record --out tape.ndjson[.gz] [--db URL]
+    python -m app.replay replay tape.ndjson[.gz] [--db URL] [--speed X]
+
+`record` turns the outbox into a tape of input commands (users, funding,
+instrument add/delete, accepted orders, amends, cancels) followed by the
+trades and final balances they produced, all read from one snapshot (a
+REPEATABLE READ transaction on Postgres, an explicit BEGIN on SQLite). Records
+follow outbox position (commit order) and carry the time each event was
+emitted, for --speed pacing. The outbox must have been on since the database
+was created, since replay starts from an empty database.
+
+`replay` feeds the commands through the same handlers the API uses
+(create_order, amend_order, cancel_order, ...) into a fresh database, either
+as fast as possible (--speed 0, the default) or at X times the recorded
+pace, then checks that trades and balances are identical to the recording
+and reports throughput and per-command latency. Exit status is 1 if
+anything differs.
+"""
+import argparse
+import gzip
+import json
+import sys
+import tempfile
+import time
+import uuid
+from datetime import timezone
+from typing import Dict, Iterator, List, Optional
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import bulk, instruments, models, outbox, schemas
+from .database import Base, SessionLocal
+from .routers.order import amend_order, cancel_order, create_order
+
+STREAM_BATCH = 1000
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+#
+# Recording
+#
+
+
+def _tape_record(kind: str, p: dict, created_at) -> Optional[dict]:
+    if kind == "user.created":
+        rec = {"op": "user", "user_id": p["user_id"], "name": p["name"], "role": p["role"]}
+    elif kind == "balance.adjusted":
+        rec = {"op": "balance", "user_id": p["user_id"], "ticker": p["ticker"], "delta": p["delta"]}
+    elif kind == "instrument.added":
+        rec = {"op": "instrument", "spec": p}
+    elif kind == "instrument.deleted":
+        rec = {"op": "delist", "ticker": p["ticker"]}
+    elif kind == "order.created":
+        rec = {"op": "order", "order_id": p["order_id"], "user_id": p["user_id"], "ticker": p["ticker"],
+               "direction": p["direction"], "qty": p["qty"], "price": p["price"]}
+    elif kind == "order.amended":
+        rec = {"op": "amend", "order_id": p["order_id"], "user_id": p["user_id"], "qty": p["qty"], "price": p["price"]}
+    elif kind == "order.cancelled":
+        rec = {"op": "cancel", "order_id": p["order_id"], "user_id": p["user_id"]}
+    elif kind == "trade":
+        rec = {"op": "expect_trade", **{k: p[k] for k in (
+            "ticker", "seq", "price", "qty", "buyer_id", "seller_id", "taker_order_id", "maker_order_id")}}
+    else:
+        return None
+    if created_at is not None and created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)  # SQLite drops the offset
+    rec["t"] = created_at.timestamp() if created_at else None
+    return rec
+
+
+def record(db: Session, path: str) -> int:
+    """Write the tape for everything in the outbox. Returns records written."""
+    # events and the balance snapshot must come from one consistent view
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    elif dialect == "sqlite":
+        # pysqlite only opens a transaction for writes, so each SELECT would
+        # otherwise see whatever was committed by the time it ran
+        conn = db.connection()
+        if not conn.connection.driver_connection.in_transaction:
+            conn.exec_driver_sql("BEGIN")
+    n = 0
+    with _open(path, "w") as f:
+        events = (
+            db.query(models.OutboxEvent.event_type, models.OutboxEvent.payload, models.OutboxEvent.created_at)
+            .filter(models.OutboxEvent.position.isnot(None))
+            .order_by(models.OutboxEvent.position)
+            .execution_options(yield_per=STREAM_BATCH)
+        )
+        for kind, payload, created_at in events:
+            rec = _tape_record(kind, payload, created_at)
+            if rec is not None:
+                f.write(json.dumps(rec, separators=(",", ":")) + "\n")
+                n += 1
+        balances = [
+            [b.user_id, b.ticker, b.amount, b.reserved or 0]
+            for b in db.query(models.Balance).order_by(models.Balance.user_id, models.Balance.ticker)
+        ]
+        f.write(json.dumps({"op": "expect_balances", "balances": balances}, separators=(",", ":")) + "\n")
+    return n + 1
+
+
+#
+# Replay
+#
+
+
+def read_tape(path: str) -> Iterator[dict]:
+    with _open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100.0 * len(sorted_values)))]
+
+
+def _balance_map(rows) -> Dict[tuple, tuple]:
+    return {(u, t): (a, r) for u, t, a, r in rows if a or r}
+
+
+class Replayer:
+    def __init__(self, db: Session):
+        self.db = db
+        self.order_ids: Dict[str, str] = {}  # recorded id -> replayed id
+        self.rejected: List[dict] = []
+
+    def _user(self, user_id: str) -> models.User:
+        user = self.db.get(models.User, user_id)
+        if user is None:
+            # users created outside the outbox (e.g. the startup admin)
+            user = models.User(id=user_id, name=user_id[:8], api_key=f"replay-{uuid.uuid4()}")
+            self.db.add(user)
+            self.db.commit()
+        return user
+
+    def apply(self, rec: dict) -> None:
+        db = self.db
+        op = rec["op"]
+        # admin-side ops write the same outbox events as the API, so a
+        # replayed database can itself be recorded
+        if op == "user":
+            db.add(models.User(id=rec["user_id"], name=rec["name"], role=models.UserRole(rec["role"]),
+                               api_key=f"replay-{uuid.uuid4()}"))
+            outbox.emit(db, "user.created", {"user_id": rec["user_id"], "name": rec["name"], "role": rec["role"]})
+            db.commit()
+        elif op == "balance":
+            self._user(rec["user_id"])
+            bulk.apply_balance_deltas(db, {(rec["user_id"], rec["ticker"]): rec["delta"]})
+            outbox.emit(db, "balance.adjusted", {"user_id": rec["user_id"], "ticker": rec["ticker"], "delta": rec["delta"]})
+            db.commit()
+        elif op == "instrument":
+            inst = models.Instrument(**rec["spec"])
+            db.add(inst)
+            outbox.emit(db, "instrument.added", rec["spec"])
+            db.commit()
+            instruments.put(inst)
+        elif op == "delist":
+            bulk.cancel_open_orders(db, rec["ticker"])
+            db.query(models.Instrument).filter(models.Instrument.ticker == rec["ticker"]).delete()
+            outbox.emit(db, "instrument.deleted", {"ticker": rec["ticker"]})
+            db.commit()
+            instruments.drop(rec["ticker"])
+        elif op == "order":
+            body = {"direction": rec["direction"], "ticker": rec["ticker"], "qty": rec["qty"]}
+            if rec["price"] is not None:
+                body["price"] = rec["price"]
+            res = create_order(body, user=self._user(rec["user_id"]), db=db)
+            self.order_ids[rec["order_id"]] = res["order_id"]
+        elif op == "amend":
+            amend_order(
+                schemas.AmendOrderBody(qty=rec["qty"], price=rec["price"]),
+                order_id=self.order_ids.get(rec["order_id"], rec["order_id"]),
+                user=self._user(rec["user_id"]),
+                db=db,
+            )
+        elif op == "cancel":
+            cancel_order(self.order_ids.get(rec["order_id"], rec["order_id"]), user=self._user(rec["user_id"]), db=db)
+        else:
+            raise ValueError(f"Unknown tape op: {op}")
+
+    def run(self, records: Iterator[dict], speed: float = 0.0) -> dict:
+        latencies: Dict[str, List[float]] = {}
+        expected_trades: List[dict] = []
+        expected_balances = None
+        t0_tape = t0_wall = None
+        ops = 0
+
+        start = time.perf_counter()
+        for rec in records:
+            op = rec["op"]
+            if op == "expect_trade":
+                expected_trades.append(rec)
+                continue
+            if op == "expect_balances":
+                expected_balances = rec["balances"]
+                continue
+
+            if speed > 0 and rec.get("t") is not None:
+                if t0_tape is None:
+                    t0_tape, t0_wall = rec["t"], time.perf_counter()
+                delay = t0_wall + (rec["t"] - t0_tape) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            t = time.perf_counter()
+            try:
+                self.apply(rec)
+            except (HTTPException, ValidationError) as e:
+                self.db.rollback()
+                self.rejected.append({"op": op, "order_id": rec.get("order_id"),
+                                      "detail": getattr(e, "detail", str(e))})
+            latencies.setdefault(op, []).append((time.perf_counter() - t) * 1000)
+            ops += 1
+        elapsed = time.perf_counter() - start
+
+        report = {
+            "ops": ops,
+            "rejected": len(self.rejected),
+            "elapsed_s": round(elapsed, 4),
+            "ops_per_s": round(ops / elapsed, 1) if elapsed else None,
+            "latency_ms": {
+                op: {
+                    "count": len(v),
+                    "p50": round(_percentile(sorted(v), 50), 3),
+                    "p99": round(_percentile(sorted(v), 99), 3),
+                    "max": round(max(v), 3),
+                }
+                for op, v in latencies.items()
+            },
+        }
+        report["trades"] = self._compare_trades(expected_trades)
+        report["balances"] = self._compare_balances(expected_balances)
+        report["identical"] = (
+            not self.rejected and report["trades"]["match"] and report["balances"]["match"] is True
+        )
+        if self.rejected:
+            report["first_rejections"] = self.rejected[:10]
+        return report
+
+    def _compare_trades(self, expected: List[dict]) -> dict:
+        keys = ("ticker", "seq", "price", "qty", "buyer_id", "seller_id", "taker_order_id", "maker_order_id")
+        actual = [
+            e.payload for e in
+            self.db.query(models.OutboxEvent).filter(models.OutboxEvent.event_type == "trade").order_by(models.OutboxEvent.position)
+        ]
+        mapped = []
+        for e in expected:
+            e = dict(e)
+            e["taker_order_id"] = self.order_ids.get(e["taker_order_id"], e["taker_order_id"])
+            e["maker_order_id"] = self.order_ids.get(e["maker_order_id"], e["maker_order_id"])
+            mapped.append(tuple(e[k] for k in keys))
+        got = [tuple(a[k] for k in keys) for a in actual]
+        first = next((i for i, (x, y) in enumerate(zip(mapped, got)) if x != y), None)
+        if first is None and len(mapped) != len(got):
+            first = min(len(mapped), len(got))
+        res = {"expected": len(mapped), "actual": len(got), "match": first is None}
+        if first is not None:
+            res["first_mismatch"] = {
+                "index": first,
+                "expected": dict(zip(keys, mapped[first])) if first < len(mapped) else None,
+                "actual": dict(zip(keys, got[first])) if first < len(got) else None,
+            }
+        return res
+
+    def _compare_balances(self, expected_rows) -> dict:
+        if expected_rows is None:
+            return {"match": None}
+        expected = _balance_map(expected_rows)
+        actual = _balance_map(
+            (b.user_id, b.ticker, b.amount, b.reserved or 0) for b in self.db.query(models.Balance)
+        )
+        diffs = [
+            {"user_id": k[0], "ticker": k[1], "expected": expected.get(k), "actual": actual.get(k)}
+            for k in sorted(set(expected) | set(actual))
+            if expected.get(k) != actual.get(k)
+        ]
+        return {"match": not diffs, "mismatches": diffs[:10]}
+
+
+def replay(tape: str, db_url: Optional[str] = None, speed: float = 0.0) -> dict:
+    if db_url is None:
+        db_url = f"sqlite:///{tempfile.mkdtemp(prefix='replay_')}/replay.db"
+    connect_args = {"check_same_thread": False} if db_url.startswith("sqlite") else {}
+    engine = create_engine(db_url, connect_args=connect_args, future=True)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+    try:
+        if db.query(models.Order).first() is not None:
+            raise SystemExit(f"replay target {db_url} is not empty")
+        instruments.load(db)
+        report = Replayer(db).run(read_tape(tape), speed=speed)
+        report["db"] = db_url
+        return report
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.replay", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    rec = sub.add_parser("record", help="write the outbox as an order tape")
+    rec.add_argument("--out", required=True, help="tape path (.gz to compress)")
+    rec.add_argument("--db", help="source database URL (default: DATABASE_URL)")
+
+    rep = sub.add_parser("replay", help="replay a tape into a fresh database and verify it")
+    rep.add_argument("tape")
+    rep.add_argument("--db", help="empty target database URL (default: temporary SQLite file)")
+    rep.add_argument("--speed", type=float, default=0.0,
+                     help="0 = as fast as possible, 1 = recorded pace, 2 = twice as fast, ...")
+
+    args = parser.parse_args(argv)
+    if args.cmd == "record":
+        if args.db:
+            engine = create_engine(args.db, future=True)
+            db = sessionmaker(bind=engine)()
+        else:
+            db = SessionLocal()
+        try:
+            n = record(db, args.out)
+        finally:
+            db.close()
+        print(f"wrote {n} records to {args.out}", file=sys.stderr)
+        return 0
+
+    report = replay(args.tape, db_url=args.db, speed=args.speed)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0 if report["identical"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+# app/reserves.py
+"""
+Invariant checker for incrementally maintained reservations.
+
+Balance.reserved is updated on every reserve/fill/refund/cancel. This
+recomputes what it should be from the open orders — streamed in batches so
+memory stays bounded by the number of (user, ticker) pairs, not orders — and
+reports every balance where the two disagree.
+"""
+from typing import Dict, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .bulk import CASH_TICKER, OPEN_STATUSES
+
+STREAM_BATCH = 1000
+
+
+def expected_reserved(db: Session) -> Dict[Tuple[str, str], int]:
+    expected: Dict[Tuple[str, str], int] = {}
+    rows = (
+        db.query(models.Order.user_id, models.Order.ticker, models.Order.direction,
+                 models.Order.price, models.Order.qty, models.Order.filled)
+        .filter(models.Order.status.in_(OPEN_STATUSES))
+        .execution_options(yield_per=STREAM_BATCH)
+    )
+    for user_id, ticker, direction, price, qty, filled in rows:
+        unfilled = qty - (filled or 0)
+        if unfilled <= 0:
+            continue
+        if direction == models.Direction.BUY:
+            if price is None:
+                continue  # market buys reserve nothing
+            key, amount = (user_id, CASH_TICKER), unfilled * price
+        else:
+            key, amount = (user_id, ticker), unfilled
+        expected[key] = expected.get(key, 0) + amount
+    return expected
+
+
+def check(db: Session) -> List[dict]:
+    """Return one entry per (user, ticker) whose Balance.reserved is wrong."""
+    expected = expected_reserved(db)
+    mismatches = []
+    seen = set()
+    rows = (
+        db.query(models.Balance.user_id, models.Balance.ticker, models.Balance.reserved)
+        .execution_options(yield_per=STREAM_BATCH)
+    )
+    for user_id, ticker, reserved in rows:
+        key = (user_id, ticker)
+        seen.add(key)
+        want = expected.get(key, 0)
+        if (reserved or 0) != want:
+            mismatches.append({"user_id": user_id, "ticker": ticker, "reserved": reserved or 0, "expected": want})
+    for (user_id, ticker), want in expected.items():
+        if (user_id, ticker) not in seen:
+            mismatches.append({"user_id": user_id, "ticker": ticker, "reserved": 0, "expected": want})
+    return mismatches
@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from ..database import get_db
 from ..auth import get_current_user, require_admin
 from .. import models
 from ..schemas import Instrument
+from ..coalesce import market_data_flight
+from .. import bulk, instruments, outbox, profiling, reserves
+from .public import INITIAL_RUB_BALANCE
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+import asyncio
+import time
 
 
 router = APIRouter(prefix="/api/v1/admin", tags=["admin"])
@@ -23,9 +30,11 @@ def add_instrument(
     admin: models.User = Depends(require_admin),
     db: Session = Depends(get_db),
 ):
-    inst = models.Instrument(ticker=body.ticker, name=body.name)
+    inst = models.Instrument(**body.model_dump())
     db.add(inst)
+    outbox.emit(db, "instrument.added", body.model_dump())
     db.commit()
+    instruments.put(inst)
     return {"success": True}
 
 
@@ -35,12 +44,67 @@ def delete_instrument(
     admin: models.User = Depends(require_admin),
     db: Session = Depends(get_db),
 ):
+    """Admin-only: delist an instrument, cancelling and refunding every open order on it"""
     inst = db.query(models.Instrument).filter(models.Instrument.ticker == ticker).first()
     if not inst:
         raise HTTPException(status_code=404, detail="Instrument not found")
+    # cancel_open_orders holds the ticker's order_seq lock until commit, so an
+    # order that is mid-placement either commits first (and is cancelled
+    # here) or sees the instrument gone
+    summary = bulk.cancel_open_orders(db, ticker)
     db.delete(inst)
+    outbox.emit(db, "instrument.deleted", {"ticker": ticker})
     db.commit()
-    return {"success": True}
+    instruments.drop(ticker)
+    return {"success": True, **summary}
+
+
+@router.post("/instrument/{ticker}/cancel_all")
+def cancel_all_orders(
+    ticker: str,
+    admin: models.User = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """Admin-only: cancel and refund every open order on a ticker"""
+    summary = bulk.cancel_open_orders(db, ticker)
+    db.commit()
+    return {"success": True, **summary}
+
+
+def _get_instrument(db: Session, ticker: str) -> models.Instrument:
+    inst = db.query(models.Instrument).filter(models.Instrument.ticker == ticker).first()
+    if not inst:
+        raise HTTPException(status_code=404, detail="Instrument not found")
+    return inst
+
+
+@router.post("/instrument/{ticker}/halt")
+def halt_instrument(
+    ticker: str,
+    admin: models.User = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """Admin-only: reject new orders on a ticker and cancel every open one"""
+    inst = _get_instrument(db, ticker)
+    summary = bulk.cancel_open_orders(db, ticker)
+    inst.halted = True
+    db.commit()
+    instruments.halt(ticker)
+    return {"success": True, "halted": True, **summary}
+
+
+@router.post("/instrument/{ticker}/resume")
+def resume_instrument(
+    ticker: str,
+    admin: models.User = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """Admin-only: accept orders on a halted ticker again"""
+    inst = _get_instrument(db, ticker)
+    inst.halted = False
+    db.commit()
+    instruments.resume(ticker)
+    return {"success": True, "halted": False}
 
 
 @router.post("/balance/deposit")
@@ -64,6 +128,7 @@ def deposit(
         db.add(bal)
     else:
         bal.amount += body.amount
+    outbox.emit(db, "balance.adjusted", {"user_id": body.user_id, "ticker": body.ticker, "delta": body.amount})
     db.commit()
     return {"success": True}
 
@@ -82,10 +147,51 @@ def withdraw(
     if not bal or bal.amount < body.amount:
         raise HTTPException(status_code=400, detail="Insufficient funds")
     bal.amount -= body.amount
+    outbox.emit(db, "balance.adjusted", {"user_id": body.user_id, "ticker": body.ticker, "delta": -body.amount})
     db.commit()
     return {"success": True}
 
 
+async def _bulk_balance(request: Request, db: Session, withdraw: bool) -> dict:
+    results = []
+    async for rows in bulk.iter_row_chunks(request, bulk.BALANCE_FIELDS):
+        results += await run_in_threadpool(bulk.apply_balance_chunk, db, rows, len(results), withdraw)
+    return bulk.summarize(results)
+
+
+@router.post("/balance/deposit/bulk")
+async def bulk_deposit(
+    request: Request,
+    admin: models.User = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """Admin-only: deposit from a JSON array or text/csv (user_id,ticker,amount)"""
+    return await _bulk_balance(request, db, withdraw=False)
+
+
+@router.post("/balance/withdraw/bulk")
+async def bulk_withdraw(
+    request: Request,
+    admin: models.User = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """Admin-only: withdraw from a JSON array or text/csv (user_id,ticker,amount)"""
+    return await _bulk_balance(request, db, withdraw=True)
+
+
+@router.post("/users/bulk")
+async def bulk_create_users(
+    request: Request,
+    admin: models.User = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """Admin-only: create users from a JSON array or text/csv (name[,role]); returns their api keys"""
+    results = []
+    async for rows in bulk.iter_row_chunks(request, bulk.USER_FIELDS):
+        results += await run_in_threadpool(bulk.provision_users_chunk, db, rows, len(results), INITIAL_RUB_BALANCE)
+    return bulk.summarize(results)
+
+
 @router.get("/balance/{user_id}", response_model=List[dict])
 def list_user_balances(
     user_id: str,
@@ -97,7 +203,17 @@ def list_user_balances(
     if not u:
         raise HTTPException(status_code=404, detail="User not found")
     bals = db.query(models.Balance).filter(models.Balance.user_id == user_id).all()
-    return [{"id": b.id, "ticker": b.ticker, "amount": b.amount} for b in bals]
+    return [{"id": b.id, "ticker": b.ticker, "amount": b.amount, "reserved": b.reserved} for b in bals]
+
+
+@router.get("/reserves/check")
+def check_reserves(
+    admin: models.User = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """Admin-only: verify every Balance.reserved against the open orders"""
+    mismatches = reserves.check(db)
+    return {"ok": not mismatches, "mismatches": mismatches}
 
 
 @router.delete("/user/{user_id}")
@@ -112,3 +228,45 @@ def delete_user(
     db.delete(u)
     db.commit()
     return {"id": user_id, "name": u.name, "role": u.role.value, "api_key": u.api_key}
+
+
+@router.get("/metrics/coalescing")
+def coalescing_metrics(admin: models.User = Depends(require_admin)):
+    """Admin-only: how many market-data reads were served by a shared in-flight query"""
+    return market_data_flight.stats()
+
+
+PROFILE_MAX_SECONDS = 60
+
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: Optional[float] = None,
+    requests: Optional[int] = None,
+    format: str = "collapsed",
+    interval_ms: float = 5,
+    admin: models.User = Depends(require_admin),
+):
+    """
+    Admin-only: sample all threads for `seconds` (default 5), or until
+    `requests` more requests have completed, capped at 60s. `format` is
+    "collapsed" (flamegraph input) or "stats" (flat self/cumulative table).
+    """
+    if format not in ("collapsed", "stats"):
+        raise HTTPException(status_code=400, detail="format must be collapsed or stats")
+    if seconds is None:
+        seconds = PROFILE_MAX_SECONDS if requests else 5
+    seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+
+    sampler = profiling.begin(max(interval_ms, 1) / 1000)
+    if sampler is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            if requests and sampler.requests >= requests:
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await asyncio.to_thread(profiling.end, sampler)
+    return sampler.collapsed() if format == "collapsed" else sampler.stats()
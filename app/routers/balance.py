@@ -7,11 +7,19 @@ from .. import models
 router = APIRouter(prefix="/api/v1", tags=["balance"])
 
 @router.get("/balance")
-def get_balances(user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_balances(detailed: bool = False, user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Available amount per ticker. With ?detailed=true, each ticker maps to
+    {"available", "locked", "total"} where locked is held by open orders.
+    """
     if not user:
         return {}
     bals = db.query(models.Balance).filter(models.Balance.user_id==user.id).all()
     res = {}
     for b in bals:
-        res[b.ticker] = b.amount
+        if detailed:
+            locked = b.reserved or 0
+            res[b.ticker] = {"available": b.amount, "locked": locked, "total": b.amount + locked}
+        else:
+            res[b.ticker] = b.amount
     return res
@@ -1,12 +1,14 @@
 # app/routers/order.py
 from fastapi import APIRouter, Depends, HTTPException, Path
 from sqlalchemy.orm import Session
-from typing import Any
+from typing import Any, Optional
 
 from ..database import get_db
 from .. import models, schemas
 from ..auth import get_current_user
 from ..matching import match_order
+from .. import outbox, instruments
+from ..sequences import order_seq
 
 router = APIRouter(prefix="/api/v1", tags=["order"])
 
@@ -21,7 +23,7 @@ def _get_or_create_balance(db: Session, user_id: str, ticker: str) -> models.Bal
         .first()
     )
     if not bal:
-        bal = models.Balance(user_id=user_id, ticker=ticker, amount=0)
+        bal = models.Balance(user_id=user_id, ticker=ticker, amount=0, reserved=0)
         db.add(bal)
         db.flush()
     return bal
@@ -34,8 +36,9 @@ def create_order(body: dict, user: models.User = Depends(get_current_user), db:
     Supports both Limit and Market orders.
     Balances are reserved at creation time:
       - BUY LIMIT: reserve RUB = price * qty
-      - BUY MARKET: no reservation (match immediately)
+      - BUY MARKET: no reservation (pays from available RUB at fill)
       - SELL: reserve qty of ticker
+    Reserving moves the amount from Balance.amount (available) to Balance.reserved.
     """
     if not user:
         raise HTTPException(status_code=401, detail="Auth required")
@@ -53,6 +56,18 @@ def create_order(body: dict, user: models.User = Depends(get_current_user), db:
     qty = int(order_body.qty)
     price = int(getattr(order_body, "price", None)) if getattr(order_body, "price", None) is not None else None
 
+    # in-memory checks against the instrument registry; no DB round trip
+    reason = instruments.validate_order(ticker, qty, price)
+    if reason:
+        raise HTTPException(status_code=400, detail=reason)
+
+    # the seq row lock serializes us with halt/delist on this ticker, and the
+    # registry may be stale if another worker halted it: re-check under the lock
+    seq = order_seq(db, ticker)
+    reason = instruments.check_tradable(db, ticker)
+    if reason:
+        raise HTTPException(status_code=400, detail=reason)
+
     # Reserve balances
     if direction == models.Direction.BUY:
         if otype == models.OrderType.LIMIT:
@@ -61,12 +76,14 @@ def create_order(body: dict, user: models.User = Depends(get_current_user), db:
             if rub_bal.amount < required:
                 raise HTTPException(status_code=400, detail="Insufficient RUB balance to place buy order")
             rub_bal.amount -= required
+            rub_bal.reserved += required
             db.flush()
     else:  # SELL
         user_bal = _get_or_create_balance(db, user.id, ticker)
         if user_bal.amount < qty:
             raise HTTPException(status_code=400, detail=f"Insufficient {ticker} balance to place sell order")
         user_bal.amount -= qty
+        user_bal.reserved += qty
         db.flush()
 
     # Create order
@@ -79,39 +96,65 @@ def create_order(body: dict, user: models.User = Depends(get_current_user), db:
         price=price,
         status=models.OrderStatus.NEW,
         filled=0,
+        seq=seq,
     )
     db.add(order)
     db.flush()
+    outbox.emit(db, "order.created", outbox.order_payload(order))
 
     # Run matching
     trades = match_order(db, order)
     db.commit()
+    if trades:
+        instruments.record_trade(ticker, trades[-1].price)
 
     return {"success": True, "order_id": order.id}
 
 
+def _order_out(o: models.Order) -> dict:
+    return {
+        "id": o.id,
+        "status": o.status.value,
+        "user_id": o.user_id,
+        "timestamp": o.timestamp,
+        "body": {
+            "direction": o.direction.value,
+            "ticker": o.ticker,
+            "qty": o.qty,
+            "price": o.price,
+        },
+        "filled": o.filled,
+        "seq": o.seq,
+    }
+
+
 @router.get("/orders", response_model=list[schemas.OrderOut])
-def list_orders(user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """List all orders for the authenticated user"""
+def list_orders(
+    ticker: Optional[str] = None,
+    after_seq: Optional[int] = None,
+    limit: Optional[int] = None,
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    List all orders for the authenticated user, optionally on one ticker.
+    With `ticker` and `after_seq`, orders with seq > after_seq oldest first:
+    order seqs are per ticker and become visible in increasing order, so
+    paging with the last seq seen never skips an accepted order. They are not
+    gap-free, and an amend that loses priority moves the order to a new seq.
+    """
     if not user:
         raise HTTPException(status_code=401, detail="Auth required")
-    orders = db.query(models.Order).filter(models.Order.user_id == user.id).all()
-    return [
-        {
-            "id": o.id,
-            "status": o.status.value,
-            "user_id": o.user_id,
-            "timestamp": o.timestamp,
-            "body": {
-                "direction": o.direction.value,
-                "ticker": o.ticker,
-                "qty": o.qty,
-                "price": o.price,
-            },
-            "filled": o.filled,
-        }
-        for o in orders
-    ]
+    q = db.query(models.Order).filter(models.Order.user_id == user.id)
+    if ticker is not None:
+        q = q.filter(models.Order.ticker == ticker)
+    if after_seq is not None:
+        if ticker is None:
+            raise HTTPException(status_code=400, detail="after_seq requires ticker")
+        q = q.filter(models.Order.seq > after_seq).order_by(models.Order.seq.asc())
+    if limit is not None:
+        q = q.limit(limit)
+    return [_order_out(o) for o in q.all()]
 
 
 @router.get("/order/{order_id}", response_model=schemas.OrderOut)
@@ -126,19 +169,34 @@ def get_order(
     o = db.query(models.Order).filter(models.Order.id == order_id, models.Order.user_id == user.id).first()
     if not o:
         raise HTTPException(status_code=404, detail="Order not found")
-    return {
-        "id": o.id,
-        "status": o.status.value,
-        "user_id": o.user_id,
-        "timestamp": o.timestamp,
-        "body": {
-            "direction": o.direction.value,
-            "ticker": o.ticker,
-            "qty": o.qty,
-            "price": o.price,
-        },
-        "filled": o.filled,
-    }
+    return _order_out(o)
+
+
+def _lock_order(db: Session, order_id: str, user: models.User) -> tuple:
+    """
+    Load one of the user's orders for a cancel or amend, after taking its
+    ticker's order_seq lock. Every change to a ticker's orders (placement
+    and matching, cancel, amend, halt/delist) takes that lock first, so
+    the order read here can't change before we commit, and locks are always
+    taken in the same order. Returns (order, the seq taken), the seq being
+    for an amend that loses priority.
+    """
+    ticker = (
+        db.query(models.Order.ticker)
+        .filter(models.Order.id == order_id, models.Order.user_id == user.id)
+        .scalar()
+    )
+    if ticker is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    seq = order_seq(db, ticker)
+    o = (
+        db.query(models.Order)
+        .filter(models.Order.id == order_id)
+        .populate_existing()
+        .with_for_update()
+        .one()
+    )
+    return o, seq
 
 
 @router.delete("/order/{order_id}", response_model=schemas.Ok)
@@ -153,14 +211,7 @@ def cancel_order(
     if not user:
         raise HTTPException(status_code=401, detail="Auth required")
 
-    o = (
-        db.query(models.Order)
-        .filter(models.Order.id == order_id, models.Order.user_id == user.id)
-        .first()
-    )
-    if not o:
-        raise HTTPException(status_code=404, detail="Order not found")
-
+    o, _ = _lock_order(db, order_id, user)
     if o.status in [models.OrderStatus.CANCELLED, models.OrderStatus.EXECUTED]:
         raise HTTPException(status_code=400, detail="Order cannot be cancelled")
 
@@ -172,10 +223,85 @@ def cancel_order(
                 refund = unfilled_qty * o.price
                 bal = _get_or_create_balance(db, user.id, CASH_TICKER)
                 bal.amount += refund
+                bal.reserved -= refund
         else:  # SELL refund ticker qty
             bal = _get_or_create_balance(db, user.id, o.ticker)
             bal.amount += unfilled_qty
+            bal.reserved -= unfilled_qty
 
     o.status = models.OrderStatus.CANCELLED
+    outbox.emit(db, "order.cancelled", outbox.order_payload(o))
     db.commit()
     return {"success": True}
+
+
+@router.patch("/order/{order_id}", response_model=schemas.OrderOut)
+def amend_order(
+    body: schemas.AmendOrderBody,
+    order_id: str = Path(..., description="Order UUID"),
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Atomically change price and/or total qty of a resting LIMIT order.
+    Only the reservation delta is taken or refunded.
+      - qty decrease at the same price keeps time priority (same seq)
+      - qty increase or price change takes a new seq; a price change
+        also runs matching once, as if the order had just been placed
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Auth required")
+
+    o, seq = _lock_order(db, order_id, user)
+    if o.status in [models.OrderStatus.CANCELLED, models.OrderStatus.EXECUTED]:
+        raise HTTPException(status_code=400, detail="Order cannot be amended")
+    if o.type != models.OrderType.LIMIT:
+        raise HTTPException(status_code=400, detail="Only limit orders can be amended")
+
+    new_qty = body.qty if body.qty is not None else o.qty
+    new_price = body.price if body.price is not None else o.price
+    if new_qty == o.qty and new_price == o.price:
+        raise HTTPException(status_code=400, detail="Nothing to amend")
+    if new_qty <= o.filled:
+        raise HTTPException(status_code=400, detail="qty must exceed the already filled qty")
+
+    price_changed = new_price != o.price
+    loses_priority = price_changed or new_qty > o.qty
+    # a pure size reduction only lowers risk: no band/tick or halt checks
+    reason = instruments.validate_amend(
+        o.ticker,
+        new_qty if new_qty != o.qty else None,
+        new_price if price_changed else None,
+    )
+    if reason is None and loses_priority:
+        # as in create_order: re-check halt/delist under the seq lock
+        reason = instruments.check_tradable(db, o.ticker)
+    if reason:
+        raise HTTPException(status_code=400, detail=reason)
+
+    # move only the difference between the old and new reservation
+    if o.direction == models.Direction.BUY:
+        bal = _get_or_create_balance(db, user.id, CASH_TICKER)
+        delta = (new_qty - o.filled) * new_price - (o.qty - o.filled) * o.price
+        shortfall = "Insufficient RUB balance to amend buy order"
+    else:
+        bal = _get_or_create_balance(db, user.id, o.ticker)
+        delta = new_qty - o.qty
+        shortfall = f"Insufficient {o.ticker} balance to amend sell order"
+    if delta > bal.amount:
+        raise HTTPException(status_code=400, detail=shortfall)
+    bal.amount -= delta
+    bal.reserved += delta
+
+    o.qty = new_qty
+    o.price = new_price
+    if loses_priority:
+        o.seq = seq
+    db.flush()
+    outbox.emit(db, "order.amended", outbox.order_payload(o))
+
+    trades = match_order(db, o) if price_changed else []
+    db.commit()
+    if trades:
+        instruments.record_trade(o.ticker, trades[-1].price)
+    return _order_out(o)
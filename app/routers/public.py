@@ -1,13 +1,20 @@
 # app/routers/public.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from .. import models, schemas
 from ..database import get_db
+from ..coalesce import market_data_flight
+from ..encoding import respond
+from .. import outbox
 import uuid
 import os
+from typing import Optional
+from datetime import datetime
 
 router = APIRouter(prefix="/api/v1/public", tags=["public"])
 
+INITIAL_RUB_BALANCE = 100000
+
 @router.post("/register", response_model=schemas.UserOut)
 def register(body: schemas.NewUser, db: Session = Depends(get_db)):
     api_key = f"key-{uuid.uuid4()}"
@@ -15,22 +22,65 @@ def register(body: schemas.NewUser, db: Session = Depends(get_db)):
     db.add(user)
     # initial balance example: give user some RUB
     db.flush()
-    bal = models.Balance(user_id=user.id, ticker="RUB", amount=100000)
+    bal = models.Balance(user_id=user.id, ticker="RUB", amount=INITIAL_RUB_BALANCE)
     db.add(bal)
+    outbox.emit(db, "user.created", {"user_id": user.id, "name": user.name, "role": "USER"})
+    outbox.emit(db, "balance.adjusted", {"user_id": user.id, "ticker": "RUB", "delta": INITIAL_RUB_BALANCE})
     db.commit()
     return {"id": user.id, "name": user.name, "role": user.role.value, "api_key": user.api_key}
 
 @router.get("/instrument", response_model=list[schemas.Instrument])
 def list_instruments(db: Session = Depends(get_db)):
     instruments = db.query(models.Instrument).all()
-    return [{"name": i.name, "ticker": i.ticker} for i in instruments]
+    return instruments
 
 @router.get("/orderbook/{ticker}", response_model=schemas.L2OrderBook)
-def get_orderbook(ticker: str, limit: int = 10, db: Session = Depends(get_db)):
+def get_orderbook(request: Request, ticker: str, limit: int = 10, db: Session = Depends(get_db)):
+    """L2 book; JSON, msgpack or packed integers depending on Accept (see app/encoding.py)."""
     from ..matching import get_orderbook_levels
-    return get_orderbook_levels(db, ticker, limit=limit)
+    # identical concurrent reads share one query (see app/coalesce.py)
+    book = market_data_flight.do(
+        ("orderbook", ticker, limit),
+        lambda: get_orderbook_levels(db, ticker, limit=limit),
+    )
+    return respond(request, book, "orderbook")
 
 @router.get("/transactions/{ticker}", response_model=list[schemas.TransactionOut])
-def get_transactions(ticker: str, limit: int = 10, db: Session = Depends(get_db)):
-    txs = db.query(models.Transaction).filter(models.Transaction.ticker==ticker).order_by(models.Transaction.timestamp.desc()).limit(limit).all()
-    return [{"id": t.id, "ticker": t.ticker, "amount": t.amount, "price": t.price, "timestamp": t.timestamp.isoformat() if t.timestamp else None} for t in txs]
+def get_transactions(request: Request, ticker: str, limit: int = 10, after_seq: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    Latest trades, newest first. With `after_seq`, trades with seq > after_seq
+    oldest first instead: per-ticker trade seqs are gap-free, so paging with the
+    last seq seen never skips or repeats a trade.
+    JSON, msgpack or packed integers depending on Accept (see app/encoding.py).
+    """
+    def _load():
+        q = db.query(models.Transaction).filter(models.Transaction.ticker==ticker)
+        if after_seq is None:
+            q = q.order_by(models.Transaction.seq.desc())
+        else:
+            q = q.filter(models.Transaction.seq > after_seq).order_by(models.Transaction.seq.asc())
+        txs = q.limit(limit).all()
+        return [{"id": t.id, "ticker": t.ticker, "amount": t.amount, "price": t.price, "timestamp": t.timestamp, "seq": t.seq} for t in txs]
+    txs = market_data_flight.do(("transactions", ticker, limit, after_seq), _load)
+    return respond(request, txs, "transactions")
+
+@router.get("/analytics/{ticker}", response_model=schemas.TradeAnalytics)
+def get_trade_analytics(
+    request: Request,
+    ticker: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: int = Query(1, ge=1),
+    db: Session = Depends(get_db),
+):
+    """
+    VWAP, volume, high/low, volume-weighted price percentiles and a
+    volume-at-price profile (prices floored to `bucket`) for trades in
+    [start, end). JSON or msgpack depending on Accept.
+    """
+    from ..analytics import trade_analytics
+    stats = market_data_flight.do(
+        ("analytics", ticker, start, end, bucket),
+        lambda: trade_analytics(db, ticker, start=start, end=end, bucket=bucket),
+    )
+    return respond(request, stats, "analytics")
@@ -27,6 +27,11 @@ class Instrument(BaseModel):
     model_config = ConfigDict(**BASE_MODEL_CONFIG)
     name: str
     ticker: str
+    tick_size: int = Field(1, ge=1)
+    lot_size: int = Field(1, ge=1)
+    min_qty: int = Field(1, ge=1)
+    max_qty: Optional[int] = Field(None, ge=1)
+    price_band_pct: Optional[int] = Field(None, ge=1)
 
 
 class Level(BaseModel):
@@ -56,6 +61,12 @@ class MarketOrderBody(BaseModel):
     qty: int = Field(..., ge=1)
 
 
+class AmendOrderBody(BaseModel):
+    model_config = ConfigDict(**BASE_MODEL_CONFIG)
+    qty: Optional[int] = Field(None, ge=1)  # new total qty, including filled
+    price: Optional[int] = Field(None, gt=0)
+
+
 class CreateOrderResponse(BaseModel):
     model_config = ConfigDict(**BASE_MODEL_CONFIG)
     success: bool = True
@@ -80,6 +91,32 @@ class TransactionOut(BaseModel):
     amount: int
     price: int
     timestamp: Optional[datetime]
+    seq: Optional[int] = None
+
+
+class VolumeLevel(BaseModel):
+    model_config = ConfigDict(**BASE_MODEL_CONFIG)
+    price: int
+    volume: int
+    trades: int
+
+
+class TradeAnalytics(BaseModel):
+    model_config = ConfigDict(**BASE_MODEL_CONFIG)
+    ticker: str
+    start: Optional[datetime]
+    end: Optional[datetime]
+    bucket: int
+    trades: int
+    volume: int
+    notional: int
+    vwap: Optional[float]
+    open: Optional[int]
+    high: Optional[int]
+    low: Optional[int]
+    last: Optional[int]
+    percentiles: Dict[str, int]
+    volume_profile: List[VolumeLevel]
 
 
 class BalanceOut(BaseModel):
@@ -106,6 +143,7 @@ class OrderOut(BaseModel):
     timestamp: Optional[datetime]
     body: OrderBody
     filled: int = 0
+    seq: Optional[int] = None
 
 
 # Generic list responses if you want typed lists in handlers
@@ -0,0 +1,52 @@
+# app/sequences.py
+"""
+Gap-free monotonic sequence numbers.
+
+Each counter is a row in `sequences`, incremented with UPDATE ... RETURNING in
+the caller's transaction. A rolled-back order or trade rolls its number back
+too, and the row lock is held until commit, so numbers become visible in
+increasing order and can be used as a paging cursor. The lock also serializes
+acceptance per counter, which is what gives same-price orders a strict FIFO
+order.
+
+Trade seqs are gap-free. Order seqs are only increasing: an amend that loses
+priority gives the order a new number, and cancels and halt/delist take one
+just for the lock (order._lock_order, bulk.cancel_open_orders), so committed
+order seqs can have gaps.
+"""
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+def _bump(db: Session, name: str, n: int):
+    return db.execute(
+        update(models.Sequence)
+        .where(models.Sequence.name == name)
+        .values(value=models.Sequence.value + n)
+        .returning(models.Sequence.value)
+    ).scalar()
+
+
+def next_seq(db: Session, name: str, n: int = 1) -> int:
+    """Take the next n numbers of a counter; returns the last one."""
+    value = _bump(db, name, n)
+    if value is not None:
+        return value
+    try:
+        with db.begin_nested():
+            db.execute(insert(models.Sequence).values(name=name, value=n))
+        return n
+    except IntegrityError:
+        # another transaction created the counter first
+        return _bump(db, name, n)
+
+
+def order_seq(db: Session, ticker: str) -> int:
+    return next_seq(db, f"order:{ticker}")
+
+
+def trade_seq(db: Session, ticker: str) -> int:
+    return next_seq(db, f"trade:{ticker}")
@@ -0,0 +1,66 @@
+"""
+Encode time and payload size of market-data formats vs JSON.
+
+    python -m scripts.bench_encoding [--levels 50] [--trades 1000]
+"""
+import argparse
+import gzip
+import json
+import timeit
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+from app import encoding
+
+
+def _orderbook(levels: int) -> dict:
+    return {
+        "bid_levels": [{"price": 10_000 - i, "qty": 10 + i} for i in range(levels)],
+        "ask_levels": [{"price": 10_001 + i, "qty": 10 + i} for i in range(levels)],
+    }
+
+
+def _transactions(n: int) -> list:
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {"id": str(uuid.uuid4()), "ticker": "BTC", "amount": 1 + i % 7, "price": 10_000 + i % 50,
+         "timestamp": t0 + timedelta(milliseconds=i * 13), "seq": i + 1}
+        for i in range(n)
+    ]
+
+
+def _fastapi_json(data) -> bytes:
+    # what the endpoints did before negotiation: jsonable_encoder + json.dumps
+    return json.dumps(jsonable_encoder(data)).encode()
+
+
+def bench(kind: str, data, number: int) -> None:
+    formats = [("json (fastapi default)", _fastapi_json), ("json (compact)", encoding.encode_json)]
+    if encoding.msgpack is not None:
+        formats.append(("msgpack", encoding.encode_msgpack))
+    formats.append(("packed", encoding.PACKERS[kind]))
+
+    print(f"\n{kind}")
+    print(f"  {'format':<24}{'bytes':>9}{'gzip':>9}{'deflate':>9}{'encode us':>12}")
+    for name, fn in formats:
+        body = fn(data)
+        us = timeit.timeit(lambda: fn(data), number=number) / number * 1e6
+        print(f"  {name:<24}{len(body):>9}{len(gzip.compress(body, 6)):>9}{len(zlib.compress(body, 6)):>9}{us:>12.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, default=50, help="orderbook levels per side")
+    parser.add_argument("--trades", type=int, default=1000, help="trades in the transactions list")
+    parser.add_argument("--number", type=int, default=200, help="encodes per measurement")
+    args = parser.parse_args()
+
+    bench("orderbook", _orderbook(args.levels), args.number)
+    bench("transactions", _transactions(args.trades), max(1, args.number // 10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+
+# app.database binds its engine when first imported, and test modules import
+# the app at collection time, so the app-level test database (used by
+# test_smoke) and admin key must be set before anything imports it
+_fd, _app_db = tempfile.mkstemp(prefix="test_toy_exchange_", suffix=".db")
+os.close(_fd)
+os.environ["DATABASE_URL"] = f"sqlite:///{_app_db}"
+os.environ["ADMIN_API_KEY"] = "test-admin-token"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import bulk, instruments, models
+from app.database import Base, get_db
+from app.main import app
+from app.routers.order import create_order
+
+
+@pytest.fixture
+def session_factory():
+    """Fresh in-memory database per test, independent of the app's DATABASE_URL."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+
+class Market:
+    """A listed TST instrument plus helpers to fund users and place orders."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def trader(self, name: str, rub: int = 0, tst: int = 0) -> models.User:
+        user_id = bulk.provision_users_chunk(self.db, [{"name": name}], 0, rub)[0]["id"]
+        bulk.apply_balance_deltas(self.db, {(user_id, "TST"): tst})
+        self.db.commit()
+        return self.db.get(models.User, user_id)
+
+    def order(self, user: models.User, direction: str, qty: int, price=None) -> models.Order:
+        body = {"direction": direction, "ticker": "TST", "qty": qty}
+        if price is not None:
+            body["price"] = price
+        return self.db.get(models.Order, create_order(body, user=user, db=self.db)["order_id"])
+
+    def balances(self, user: models.User) -> dict:
+        rows = self.db.query(models.Balance).filter(models.Balance.user_id == user.id)
+        return {b.ticker: (b.amount, b.reserved) for b in rows}
+
+
+@pytest.fixture
+def market(session_factory):
+    db = session_factory()
+    db.add(models.Instrument(ticker="TST", name="Test"))
+    db.commit()
+    instruments.load(db)
+    yield Market(db)
+    instruments.drop("TST")
+    db.close()
+
+
+ADMIN_KEY = "admin-key"
+
+
+@pytest.fixture
+def admin_client(session_factory):
+    """TestClient on the session_factory database, authenticated as an admin."""
+    db = session_factory()
+    db.add(models.User(name="admin", role=models.UserRole.ADMIN, api_key=ADMIN_KEY))
+    db.commit()
+    db.close()
+
+    def _get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = _get_db
+    yield TestClient(app, headers={"Authorization": f"TOKEN {ADMIN_KEY}"})
+    app.dependency_overrides.clear()
@@ -0,0 +1,96 @@
+import pytest
+from fastapi import HTTPException
+
+from app import instruments, models, reserves
+from app.routers.order import amend_order, cancel_order
+from app.schemas import AmendOrderBody
+
+
+def _amend(market, user, order, **changes):
+    amend_order(AmendOrderBody(**changes), order_id=order.id, user=user, db=market.db)
+    market.db.refresh(order)
+    return order
+
+
+def test_size_decrease_keeps_priority(market):
+    a, b, s = market.trader("alice", rub=1000), market.trader("bob", rub=1000), market.trader("sam", tst=5)
+    first = market.order(a, "BUY", 5, 100)
+    market.order(b, "BUY", 5, 100)
+    seq = first.seq
+
+    _amend(market, a, first, qty=3)
+    assert first.seq == seq
+    market.order(s, "SELL", 1, 100)
+    market.db.refresh(first)
+    assert first.filled == 1
+    assert market.balances(a) == {"RUB": (700, 200), "TST": (1, 0)}
+    assert reserves.check(market.db) == []
+
+
+def test_reservation_moves_by_the_delta_after_a_partial_fill(market):
+    buyer, seller = market.trader("buyer", rub=1000), market.trader("seller", tst=10)
+
+    bid = market.order(buyer, "BUY", 5, 100)
+    market.order(seller, "SELL", 2, 100)
+    assert market.balances(buyer)["RUB"] == (500, 300)
+    _amend(market, buyer, bid, qty=4)
+    assert market.balances(buyer)["RUB"] == (600, 200)
+    _amend(market, buyer, bid, price=90)
+    assert market.balances(buyer)["RUB"] == (620, 180)
+
+    ask = market.order(seller, "SELL", 5, 110)
+    market.order(buyer, "BUY", 2, 110)
+    assert market.balances(seller)["TST"] == (3, 3)
+    _amend(market, seller, ask, qty=6)
+    assert market.balances(seller)["TST"] == (2, 4)
+    _amend(market, seller, ask, qty=3)
+    assert market.balances(seller)["TST"] == (5, 1)
+    assert reserves.check(market.db) == []
+
+
+def test_price_change_that_crosses_matches_once(market):
+    db = market.db
+    buyer, seller = market.trader("buyer", rub=1000), market.trader("seller", tst=5)
+    ask = market.order(seller, "SELL", 2, 105)
+    bid = market.order(buyer, "BUY", 3, 100)
+
+    _amend(market, buyer, bid, price=105)
+    db.refresh(ask)
+    assert (bid.filled, bid.status, ask.status) == (2, models.OrderStatus.NEW, models.OrderStatus.EXECUTED)
+    assert [(t.price, t.amount) for t in db.query(models.Transaction)] == [(105, 2)]
+    assert market.balances(buyer) == {"RUB": (685, 105), "TST": (2, 0)}
+    assert reserves.check(db) == []
+
+
+def test_size_decrease_allowed_outside_price_band(market):
+    db = market.db
+    inst = db.get(models.Instrument, "TST")
+    inst.price_band_pct = 10
+    db.commit()
+    instruments.put(inst)
+    buyer, other, seller = market.trader("buyer", rub=1000), market.trader("other", rub=1000), market.trader("seller", tst=5)
+
+    bid = market.order(buyer, "BUY", 2, 91)
+    market.order(seller, "SELL", 1, 105)
+    market.order(other, "BUY", 1, 105)
+    assert instruments.last_price("TST") == 105
+
+    assert _amend(market, buyer, bid, qty=1).qty == 1
+    with pytest.raises(HTTPException) as e:
+        _amend(market, buyer, bid, price=92)
+    assert "band" in e.value.detail
+
+
+def test_filled_and_cancelled_orders_cannot_be_amended(market):
+    db = market.db
+    buyer, seller = market.trader("buyer", rub=1000), market.trader("seller", tst=5)
+    filled = market.order(buyer, "BUY", 1, 100)
+    market.order(seller, "SELL", 1, 100)
+    cancelled = market.order(buyer, "BUY", 1, 90)
+    cancel_order(cancelled.id, user=buyer, db=db)
+
+    for o in (filled, cancelled):
+        with pytest.raises(HTTPException) as e:
+            _amend(market, buyer, o, qty=2)
+        assert e.value.status_code == 400
+        db.rollback()
@@ -0,0 +1,59 @@
+from datetime import timedelta, timezone
+
+import numpy as np
+
+from app import models
+from app.analytics import TradeStats, trade_analytics
+
+
+def test_chunked_stats_match_single_pass():
+    rng = np.random.default_rng(0)
+    prices = rng.integers(90, 110, size=10_000)
+    amounts = rng.integers(1, 50, size=10_000)
+
+    whole = TradeStats()
+    whole.add_chunk(prices, amounts)
+    chunked = TradeStats()
+    for i in range(0, prices.size, 777):
+        chunked.add_chunk(prices[i:i + 777], amounts[i:i + 777])
+
+    a, b = whole.result(bucket=5), chunked.result(bucket=5)
+    assert a == b
+    assert a["volume"] == amounts.sum()
+    assert abs(a["vwap"] - (prices * amounts).sum() / amounts.sum()) < 1e-9
+    assert a["open"] == prices[0] and a["last"] == prices[-1]
+    assert sum(level["volume"] for level in a["volume_profile"]) == a["volume"]
+
+
+def test_trade_analytics_from_db(session_factory):
+    db = session_factory()
+    for seq, (price, amount) in enumerate([(100, 1), (102, 3), (101, 1), (100, 5)], start=1):
+        db.add(models.Transaction(ticker="BTC", price=price, amount=amount, seq=seq))
+    db.add(models.Transaction(ticker="ETH", price=5, amount=1, seq=1))
+    db.commit()
+
+    res = trade_analytics(db, "BTC", chunk_size=3)
+    assert res["trades"] == 4
+    assert res["volume"] == 10
+    assert res["notional"] == 100 + 306 + 101 + 500
+    assert (res["open"], res["high"], res["low"], res["last"]) == (100, 102, 100, 100)
+    assert res["percentiles"]["p50"] == 100
+    assert res["percentiles"]["p95"] == 102
+    assert trade_analytics(db, "NONE")["vwap"] is None
+    db.close()
+
+
+def test_window_is_start_inclusive_end_exclusive(session_factory):
+    db = session_factory()
+    db.add(models.Transaction(ticker="BTC", price=100, amount=1, seq=1))
+    db.commit()
+    # stamped by the database at whole-second resolution
+    ts = db.query(models.Transaction.timestamp).scalar()
+    assert ts.microsecond == 0
+
+    assert trade_analytics(db, "BTC", start=ts)["trades"] == 1
+    assert trade_analytics(db, "BTC", end=ts)["trades"] == 0
+    assert trade_analytics(db, "BTC", start=ts.replace(microsecond=1))["trades"] == 0
+    assert trade_analytics(db, "BTC", end=ts.replace(microsecond=1))["trades"] == 1
+    assert trade_analytics(db, "BTC", start=ts.replace(tzinfo=timezone(timedelta(hours=3))) + timedelta(hours=3))["trades"] == 1
+    db.close()
@@ -0,0 +1,121 @@
+from app import bulk, models
+
+
+def test_bulk_deposit_and_withdraw_per_row_results(session_factory):
+    db = session_factory()
+    users = bulk.provision_users_chunk(db, [{"name": "mm-1"}, {"name": "x"}, {"name": "mm-2"}], 0, 1000)
+    assert [r["status"] for r in users] == ["ok", "error", "ok"]
+    a, b = users[0]["id"], users[2]["id"]
+
+    res = bulk.apply_balance_chunk(
+        db,
+        [
+            {"user_id": a, "ticker": "BTC", "amount": 5},
+            {"user_id": a, "ticker": "BTC", "amount": "2"},
+            {"user_id": "missing", "ticker": "BTC", "amount": 1},
+            {"user_id": b, "ticker": "RUB", "amount": 10},
+        ],
+        0,
+        withdraw=False,
+    )
+    assert [r["status"] for r in res] == ["ok", "ok", "error", "ok"]
+
+    res = bulk.apply_balance_chunk(
+        db,
+        [
+            {"user_id": a, "ticker": "BTC", "amount": 4},
+            {"user_id": a, "ticker": "BTC", "amount": 4},
+            {"user_id": b, "ticker": "RUB", "amount": 0},
+        ],
+        10,
+        withdraw=True,
+    )
+    assert [(r["row"], r["status"]) for r in res] == [(10, "ok"), (11, "error"), (12, "error")]
+
+    amounts = {(x.user_id, x.ticker): x.amount for x in db.query(models.Balance)}
+    assert amounts[(a, "BTC")] == 3
+    assert amounts[(b, "RUB")] == 1010
+    db.close()
+
+
+def test_cancel_open_orders_refunds_reservations(session_factory):
+    db = session_factory()
+    a = bulk.provision_users_chunk(db, [{"name": "mm-1"}], 0, 0)[0]["id"]
+    db.add_all([
+        models.Order(user_id=a, type=models.OrderType.LIMIT, direction=models.Direction.BUY,
+                     ticker="BTC", qty=3, price=100, filled=1, status=models.OrderStatus.NEW),
+        models.Order(user_id=a, type=models.OrderType.LIMIT, direction=models.Direction.SELL,
+                     ticker="BTC", qty=5, price=200, filled=0, status=models.OrderStatus.NEW),
+        models.Order(user_id=a, type=models.OrderType.LIMIT, direction=models.Direction.SELL,
+                     ticker="BTC", qty=5, price=200, filled=5, status=models.OrderStatus.EXECUTED),
+        models.Order(user_id=a, type=models.OrderType.LIMIT, direction=models.Direction.SELL,
+                     ticker="ETH", qty=1, price=10, filled=0, status=models.OrderStatus.NEW),
+    ])
+    db.commit()
+
+    summary = bulk.cancel_open_orders(db, "BTC")
+    db.commit()
+    assert summary["cancelled_orders"] == 2
+    assert summary["refunded_rub"] == 200
+    assert summary["refunded_qty"] == 5
+
+    amounts = {x.ticker: x.amount for x in db.query(models.Balance).filter(models.Balance.user_id == a)}
+    assert amounts == {"RUB": 200, "BTC": 5}
+    statuses = sorted(o.status.value for o in db.query(models.Order).filter(models.Order.ticker == "BTC"))
+    assert statuses == ["CANCELLED", "CANCELLED", "EXECUTED"]
+    assert db.query(models.OutboxEvent).filter(models.OutboxEvent.event_type == "order.cancelled").count() == 2
+    db.close()
+
+
+def test_bulk_deposit_json_body(admin_client, session_factory):
+    db = session_factory()
+    user_id = bulk.provision_users_chunk(db, [{"name": "mm-1"}], 0, 0)[0]["id"]
+    db.close()
+
+    r = admin_client.post("/api/v1/admin/balance/deposit/bulk", json=[
+        {"user_id": user_id, "ticker": "RUB", "amount": 100},
+        {"user_id": "missing", "ticker": "RUB", "amount": 1},
+        {"user_id": user_id, "ticker": "RUB", "amount": -5},
+    ])
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["total"], body["applied"], body["failed"]) == (3, 1, 2)
+    assert [(x["row"], x["status"], x.get("detail")) for x in body["results"]] == [
+        (0, "ok", None), (1, "error", "User not found"), (2, "error", "Amount must be positive"),
+    ]
+
+    r = admin_client.post("/api/v1/admin/balance/withdraw/bulk", json=[
+        {"user_id": user_id, "ticker": "RUB", "amount": 60},
+        {"user_id": user_id, "ticker": "RUB", "amount": 60},
+    ])
+    assert [x["status"] for x in r.json()["results"]] == ["ok", "error"]
+    assert r.json()["results"][1]["detail"] == "Insufficient funds"
+
+
+def test_bulk_users_streamed_csv(admin_client):
+    # BOM, a row split across body chunks and a two-byte character split between them
+    csv_bytes = "\ufeffname,role\nМария,USER\nboss,admin\nab,USER\n".encode()
+    cut = csv_bytes.index("М".encode()) + 1
+    chunks = [csv_bytes[:cut], csv_bytes[cut:cut + 7], csv_bytes[cut + 7:]]
+
+    r = admin_client.post(
+        "/api/v1/admin/users/bulk",
+        content=iter(chunks),
+        headers={"Content-Type": "text/csv"},
+    )
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [(x["status"], x.get("name"), x.get("role")) for x in results[:2]] == [
+        ("ok", "Мария", "USER"), ("ok", "boss", "ADMIN"),
+    ]
+    assert results[2] == {"row": 2, "status": "error", "detail": "name must be at least 3 characters"}
+
+
+def test_bulk_csv_missing_header_column(admin_client):
+    r = admin_client.post(
+        "/api/v1/admin/balance/deposit/bulk",
+        content=b"user_id,amount\nu1,5\n",
+        headers={"Content-Type": "text/csv"},
+    )
+    assert r.status_code == 400
+    assert r.json()["detail"] == "CSV header missing columns: ticker"
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+
+from app.coalesce import SingleFlight
+
+
+def test_concurrent_sync_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"bid_levels": [], "ask_levels": []}
+
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do(("orderbook", "BTC", 10), slow)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert all(r is results[0] for r in results)
+    stats = flight.stats()
+    assert stats["executed"] == 1
+    assert stats["coalesced"] == 7
+    assert stats["in_flight"] == 0
+
+
+def test_async_calls_share_one_execution_and_errors_propagate():
+    flight = SingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def boom():
+        await asyncio.sleep(0.05)
+        raise ValueError("boom")
+
+    async def run():
+        ok = await asyncio.gather(*[flight.ado("k", slow) for _ in range(5)])
+        errs = await asyncio.gather(*[flight.ado("e", boom) for _ in range(3)], return_exceptions=True)
+        return ok, errs
+
+    ok, errs = asyncio.run(run())
+    assert ok == [42] * 5
+    assert len(calls) == 1
+    assert all(isinstance(e, ValueError) for e in errs)
+    assert flight.stats()["coalesced"] == 6
+
+
+def test_cancelled_async_caller_does_not_cancel_followers():
+    flight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def run():
+        leader = asyncio.ensure_future(flight.ado("k", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.ado("k", slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # e.g. the first client disconnected
+        result = await follower
+        try:
+            await leader
+        except asyncio.CancelledError:
+            pass
+        return result, leader.cancelled()
+
+    assert asyncio.run(run()) == (42, True)
+    assert flight.stats() == {"executed": 1, "coalesced": 1, "in_flight": 0, "coalesce_ratio": 0.5}
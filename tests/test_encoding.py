@@ -0,0 +1,65 @@
+import gzip
+import struct
+from datetime import datetime, timezone
+
+import msgpack
+from starlette.requests import Request
+
+from app import encoding
+
+
+def _request(accept: str = "", accept_encoding: str = "") -> Request:
+    headers = [(b"accept", accept.encode()), (b"accept-encoding", accept_encoding.encode())]
+    return Request({"type": "http", "headers": headers})
+
+
+BOOK = {"bid_levels": [{"price": 100, "qty": 2}], "ask_levels": [{"price": 101, "qty": 3}, {"price": 102, "qty": 1}]}
+
+
+def test_negotiation_and_packed_layout():
+    assert encoding.negotiate("application/msgpack", "orderbook") == encoding.MSGPACK
+    assert encoding.negotiate("application/x-toy-packed", "orderbook") == encoding.PACKED
+    assert encoding.negotiate("application/x-toy-packed", "analytics") == encoding.JSON
+    assert encoding.negotiate("*/*", "orderbook") == encoding.JSON
+
+    r = encoding.respond(_request("application/x-toy-packed"), BOOK, "orderbook")
+    assert r.media_type == encoding.PACKED
+    assert struct.unpack("<II6q", r.body) == (1, 2, 100, 2, 101, 3, 102, 1)
+
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    txs = [{"id": "a", "ticker": "BTC", "amount": 2, "price": 100, "timestamp": ts, "seq": 7}]
+    body = encoding.pack_transactions(txs)
+    assert struct.unpack("<I4q", body) == (1, 7, 100, 2, int(ts.timestamp() * 1000))
+
+    r = encoding.respond(_request("application/msgpack"), txs, "transactions")
+    assert msgpack.unpackb(r.body, timestamp=3)[0]["timestamp"] == ts
+
+
+def test_large_bodies_are_compressed_when_accepted():
+    big = {"bid_levels": [{"price": p, "qty": 1} for p in range(500)], "ask_levels": []}
+    r = encoding.respond(_request(accept_encoding="gzip, deflate"), big, "orderbook")
+    assert r.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(r.body) == encoding.encode_json(big)
+
+    small = encoding.respond(_request(accept_encoding="gzip"), BOOK, "orderbook")
+    assert "content-encoding" not in small.headers
+
+
+def test_q_values_are_honoured():
+    assert encoding.negotiate("application/json, application/msgpack;q=0", "orderbook") == encoding.JSON
+    assert encoding.negotiate("application/json, application/msgpack;q=0.5", "orderbook") == encoding.JSON
+    assert encoding.negotiate("application/json;q=0.5, application/msgpack", "orderbook") == encoding.MSGPACK
+    assert encoding.negotiate("application/msgpack;q=0.5, */*", "orderbook") == encoding.JSON
+    assert encoding.negotiate("application/x-toy-packed;q=0.9, application/msgpack;q=0.8", "orderbook") == encoding.PACKED
+
+    assert encoding._choose_encoding("gzip;q=0") is None
+    assert encoding._choose_encoding("gzip;q=0, deflate") == "deflate"
+    assert encoding._choose_encoding("gzip;q=0.5, deflate;q=0.8") == "deflate"
+    assert encoding._choose_encoding("identity, gzip;q=0.5") is None
+    assert encoding._choose_encoding("*") == "gzip"
+    assert encoding._choose_encoding("") is None
+
+    big = {"bid_levels": [{"price": p, "qty": 1} for p in range(500)], "ask_levels": []}
+    r = encoding.respond(_request("application/json, application/msgpack;q=0", "gzip;q=0"), big, "orderbook")
+    assert r.media_type == encoding.JSON
+    assert "content-encoding" not in r.headers
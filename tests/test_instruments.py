@@ -0,0 +1,108 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import bulk, instruments, models, reserves
+from app.database import Base
+from app.routers.order import amend_order, cancel_order, create_order
+from app.schemas import AmendOrderBody
+
+
+def test_registry_load_and_validate(session_factory):
+    db = session_factory()
+    db.add(models.Instrument(ticker="TST", name="Test", tick_size=5, lot_size=10, min_qty=10, max_qty=100, price_band_pct=20))
+    db.add(models.Transaction(ticker="TST", amount=10, price=400, seq=1))
+    db.add(models.Transaction(ticker="TST", amount=10, price=500, seq=2))
+    db.commit()
+    instruments.load(db)
+    db.close()
+    try:
+        assert instruments.last_price("TST") == 500
+        assert instruments.validate_order("TST", 20, 500) is None
+        assert instruments.validate_order("TST", 20, None) is None
+        assert "Unknown" in instruments.validate_order("NOPE", 20, 500)
+        assert "lot size" in instruments.validate_order("TST", 15, 500)
+        assert "maximum" in instruments.validate_order("TST", 110, 500)
+        assert "tick size" in instruments.validate_order("TST", 20, 502)
+        assert "band" in instruments.validate_order("TST", 20, 605)
+
+        instruments.halt("TST")
+        assert "halted" in instruments.validate_order("TST", 20, 500)
+    finally:
+        instruments.drop("TST")
+    assert instruments.get("TST") is None
+
+
+def test_halt_is_persisted_and_rechecked_in_the_order_transaction(session_factory):
+    db = session_factory()
+    user_id = bulk.provision_users_chunk(db, [{"name": "trader"}], 0, 1000)[0]["id"]
+    user = db.get(models.User, user_id)
+    db.add(models.Instrument(ticker="TST", name="Test", halted=True))
+    db.commit()
+    instruments.load(db)
+    try:
+        assert instruments.is_halted("TST")  # loaded from the table
+
+        # the table says halted, this worker's registry doesn't (e.g. halted by another worker)
+        instruments.resume("TST")
+        with pytest.raises(HTTPException) as e:
+            create_order({"direction": "BUY", "ticker": "TST", "qty": 1, "price": 10}, user=user, db=db)
+        assert "halted" in e.value.detail
+        db.rollback()
+        db.query(models.Instrument).delete()
+        db.commit()
+        with pytest.raises(HTTPException) as e:
+            create_order({"direction": "BUY", "ticker": "TST", "qty": 1, "price": 10}, user=user, db=db)
+        assert "Unknown" in e.value.detail
+        db.rollback()
+
+        assert db.query(models.Order).count() == 0
+        assert db.query(models.Balance.reserved).filter(models.Balance.user_id == user_id).scalar() == 0
+    finally:
+        instruments.drop("TST")
+        db.close()
+
+
+@pytest.fixture
+def two_sessions(tmp_path):
+    """Two sessions on separate connections to one SQLite file, like two workers."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    db = Session()
+    user_id = bulk.provision_users_chunk(db, [{"name": "trader"}], 0, 1000)[0]["id"]
+    db.add(models.Instrument(ticker="TST", name="Test"))
+    db.commit()
+    instruments.load(db)
+    db.close()
+    a, b = Session(), Session()
+    yield a, b, a.get(models.User, user_id)
+    a.close()
+    b.close()
+    instruments.drop("TST")
+    engine.dispose()
+
+
+@pytest.mark.parametrize("change", ["cancel", "amend"])
+def test_halt_between_read_and_write_is_not_refunded_twice(two_sessions, change):
+    a, b, user = two_sessions
+    order_id = create_order({"direction": "BUY", "ticker": "TST", "qty": 5, "price": 100}, user=user, db=a)["order_id"]
+    seen = a.get(models.Order, order_id)  # A has read the open order...
+    assert seen.status == models.OrderStatus.NEW
+
+    bulk.cancel_open_orders(b, "TST")  # ...when the halt commits in B
+    b.query(models.Instrument).update({"halted": True})
+    b.commit()
+
+    with pytest.raises(HTTPException) as e:
+        if change == "cancel":
+            cancel_order(order_id, user=user, db=a)
+        else:
+            amend_order(AmendOrderBody(qty=3), order_id=order_id, user=user, db=a)
+    assert e.value.status_code == 400
+    a.rollback()
+
+    bal = a.query(models.Balance).filter(models.Balance.user_id == user.id, models.Balance.ticker == "RUB").one()
+    assert (bal.amount, bal.reserved) == (1000, 0)
+    assert reserves.check(a) == []
@@ -0,0 +1,65 @@
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from app import models, reserves
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the tables as the original create_all made them
+OLD_SCHEMA = [
+    "CREATE TABLE users (id VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, role VARCHAR(5), api_key VARCHAR NOT NULL UNIQUE)",
+    "CREATE TABLE instruments (ticker VARCHAR PRIMARY KEY, name VARCHAR NOT NULL)",
+    "CREATE TABLE balances (id VARCHAR PRIMARY KEY, user_id VARCHAR REFERENCES users (id), ticker VARCHAR, amount INTEGER)",
+    "CREATE TABLE orders (id VARCHAR PRIMARY KEY, user_id VARCHAR REFERENCES users (id), type VARCHAR(6), "
+    "direction VARCHAR(4), ticker VARCHAR, qty INTEGER, price INTEGER, status VARCHAR(18), "
+    "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, filled INTEGER)",
+    "CREATE TABLE transactions (id VARCHAR PRIMARY KEY, ticker VARCHAR, amount INTEGER, price INTEGER, "
+    "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)",
+]
+
+
+def test_upgrade_backfills_reserved_and_seqs(tmp_path):
+    url = f"sqlite:///{tmp_path / 'old.db'}"
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        for ddl in OLD_SCHEMA:
+            conn.execute(text(ddl))
+        conn.execute(text("INSERT INTO users VALUES ('u1', 'trader', 'USER', 'key')"))
+        conn.execute(text("INSERT INTO instruments VALUES ('TST', 'Test')"))
+        # reservations were already taken out of amount
+        conn.execute(text("INSERT INTO balances VALUES ('b1', 'u1', 'RUB', 900), ('b2', 'u1', 'TST', 5)"))
+        conn.execute(text(
+            "INSERT INTO orders VALUES "
+            "('o-late', 'u1', 'LIMIT', 'BUY', 'TST', 10, 7, 'PARTIALLY_EXECUTED', '2024-01-02 00:00:00', 4), "
+            "('o-early', 'u1', 'LIMIT', 'BUY', 'TST', 5, 8, 'NEW', '2024-01-01 00:00:00', 0), "
+            "('o-sell', 'u1', 'LIMIT', 'SELL', 'TST', 3, 20, 'NEW', '2024-01-03 00:00:00', 0), "
+            "('o-done', 'u1', 'LIMIT', 'BUY', 'TST', 4, 7, 'EXECUTED', '2024-01-01 12:00:00', 4)"
+        ))
+        conn.execute(text(
+            "INSERT INTO transactions VALUES ('t2', 'TST', 4, 7, '2024-01-02 00:00:00'), "
+            "('t1', 'TST', 4, 7, '2024-01-01 12:00:00')"
+        ))
+
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, "head")
+
+    assert {"ix_orders_ticker_seq", "ix_orders_book"} <= {i["name"] for i in inspect(engine).get_indexes("orders")}
+    with Session(engine) as db:
+        assert reserves.check(db) == []
+        assert db.get(models.Balance, "b1").reserved == 5 * 8 + 6 * 7
+        assert db.get(models.Balance, "b1").amount == 900
+        assert db.get(models.Balance, "b2").reserved == 3
+        assert [(o.id, o.seq) for o in db.query(models.Order).order_by(models.Order.seq)] == [
+            ("o-done", None), ("o-early", 1), ("o-late", 2), ("o-sell", 3)]
+        assert [t.id for t in db.query(models.Transaction).order_by(models.Transaction.seq)] == ["t1", "t2"]
+        assert db.get(models.Sequence, "order:TST").value == 3
+        assert db.get(models.Sequence, "trade:TST").value == 2
+        instrument = db.get(models.Instrument, "TST")
+        assert (instrument.tick_size, instrument.lot_size, instrument.halted) == (1, 1, False)
+    engine.dispose()
@@ -0,0 +1,71 @@
+from app import models, outbox
+
+
+def test_drainer_batches_and_checkpoints(session_factory):
+    Session = session_factory
+    db = Session()
+    for i in range(5):
+        outbox.emit(db, "trade", {"n": i})
+    db.commit()
+    # rolled back events never reach the outbox
+    outbox.emit(db, "trade", {"n": 99})
+    db.rollback()
+    db.close()
+
+    received = []
+    drainer = outbox.OutboxDrainer(
+        "test", outbox.CallbackSink(received.append), batch_size=2, session_factory=Session
+    )
+    assert drainer.drain_all() == 5
+    assert [len(b) for b in received] == [2, 2, 1]
+    assert [e["payload"]["n"] for b in received for e in b] == [0, 1, 2, 3, 4]
+
+    # nothing new -> nothing re-delivered
+    assert drainer.drain_once() == 0
+
+
+def test_failed_publish_does_not_advance_checkpoint(session_factory):
+    Session = session_factory
+    db = Session()
+    outbox.emit(db, "order.created", {"order_id": "a"})
+    db.commit()
+    db.close()
+
+    def fail(events):
+        raise RuntimeError("sink down")
+
+    drainer = outbox.OutboxDrainer("test", outbox.CallbackSink(fail), session_factory=Session)
+    try:
+        drainer.drain_once()
+    except RuntimeError:
+        pass
+
+    received = []
+    drainer.sink = outbox.CallbackSink(received.append)
+    assert drainer.drain_once() == 1
+    assert received[0][0]["type"] == "order.created"
+
+    db = Session()
+    assert db.get(models.OutboxCheckpoint, "test").last_position == received[0][0]["position"]
+    db.close()
+
+
+def test_checkpoint_follows_commit_order_not_id_order(session_factory):
+    Session = session_factory
+    received = []
+    drainer = outbox.OutboxDrainer("test", outbox.CallbackSink(received.extend), session_factory=Session)
+
+    # as on Postgres: A takes id 10, B takes id 11 and commits first
+    a, b = Session(), Session()
+    outbox.emit(a, "trade", {"n": "a"})
+    next(iter(a.new)).id = 10
+    outbox.emit(b, "trade", {"n": "b"})
+    next(iter(b.new)).id = 11
+    b.commit()
+    assert drainer.drain_all() == 1
+
+    a.commit()
+    assert drainer.drain_all() == 1
+    assert [(e["id"], e["position"], e["payload"]["n"]) for e in received] == [(11, 1, "b"), (10, 2, "a")]
+    a.close()
+    b.close()
@@ -0,0 +1,55 @@
+import logging
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app import main, profiling
+from app.database import SqlStats
+
+
+def test_sql_stats_keeps_slowest_statements():
+    stats = SqlStats()
+    for i in range(10):
+        stats.record(f"SELECT {i}", i / 1000)
+    assert stats.count == 10
+    assert [s for _, s in stats.slowest] == ["SELECT 9", "SELECT 8", "SELECT 7", "SELECT 6", "SELECT 5"]
+
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_sees_busy_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,))
+    worker.start()
+    sampler = profiling.begin(0.001)
+    assert profiling.begin(0.001) is None  # one session at a time
+    time.sleep(0.1)
+    profiling.end(sampler)
+    stop.set()
+    worker.join()
+
+    assert "_busy_loop" in sampler.collapsed()
+    assert "_busy_loop" in sampler.stats()
+
+
+def test_slow_request_logger(monkeypatch, caplog):
+    monkeypatch.setattr(main, "SLOW_REQUEST_MS", 0)
+    with caplog.at_level(logging.WARNING, logger="app.main"):
+        assert TestClient(main.app).get("/api/v1/public/instrument").status_code == 200
+    [line] = [r.getMessage() for r in caplog.records if r.name == "app.main"]
+    assert line.startswith("slow request GET /api/v1/public/instrument: ")
+    assert "1 SQL statements" in line and "slowest: " in line and "SELECT instruments." in line
+
+
+def test_profile_endpoint(admin_client):
+    r = admin_client.post("/api/v1/admin/profile?seconds=0.2&format=stats&interval_ms=1")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert "stack samples over" in r.text
+    # the session ended, so the next one can start
+    assert admin_client.post("/api/v1/admin/profile?seconds=0.1").status_code == 200
+    assert admin_client.post("/api/v1/admin/profile?format=pstats").status_code == 400
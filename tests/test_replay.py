@@ -0,0 +1,95 @@
+import json
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import instruments, models, replay
+from app.database import Base
+
+TAPE = [
+    {"op": "user", "user_id": "u1", "name": "alice", "role": "USER"},
+    {"op": "user", "user_id": "u2", "name": "bob", "role": "USER"},
+    {"op": "balance", "user_id": "u1", "ticker": "RUB", "delta": 10_000},
+    {"op": "balance", "user_id": "u2", "ticker": "TST", "delta": 50},
+    {"op": "instrument", "spec": {"ticker": "TST", "name": "Test"}},
+    {"op": "order", "order_id": "o1", "user_id": "u2", "ticker": "TST", "direction": "SELL", "qty": 5, "price": 101},
+    {"op": "order", "order_id": "o2", "user_id": "u2", "ticker": "TST", "direction": "SELL", "qty": 5, "price": 100},
+    {"op": "order", "order_id": "o3", "user_id": "u1", "ticker": "TST", "direction": "BUY", "qty": 7, "price": 101},
+    {"op": "amend", "order_id": "o1", "user_id": "u2", "qty": 4, "price": 101},
+    {"op": "order", "order_id": "o4", "user_id": "u1", "ticker": "TST", "direction": "BUY", "qty": 2, "price": 90},
+    {"op": "cancel", "order_id": "o4", "user_id": "u1"},
+]
+
+
+def _write(path, records):
+    with open(path, "w") as f:
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+
+
+def test_record_then_replay_is_identical(session_factory, tmp_path):
+    db = session_factory()
+    instruments.load(db)
+    try:
+        source = replay.Replayer(db).run(iter(TAPE))
+        assert source["rejected"] == 0
+        tape = str(tmp_path / "tape.ndjson.gz")
+        replay.record(db, tape)
+    finally:
+        db.close()
+        instruments.drop("TST")
+
+    # stamped at emit time with sub-second resolution, in commit order
+    ts = [rec["t"] for rec in replay.read_tape(tape) if rec["op"] != "expect_balances"]
+    assert ts == sorted(ts)
+    assert any(t != int(t) for t in ts)
+
+    report = replay.replay(tape, db_url=f"sqlite:///{tmp_path / 'a.db'}")
+    assert report["trades"] == {"expected": 2, "actual": 2, "match": True}
+    assert report["balances"]["match"] is True
+    assert report["identical"] is True
+    assert report["latency_ms"]["order"]["count"] == 4
+
+    # a tape that no longer reproduces its recorded trades is flagged
+    records = list(replay.read_tape(tape))
+    for rec in records:
+        if rec["op"] == "order" and rec["direction"] == "SELL" and rec["price"] == 100:
+            rec["price"] = 99
+    tampered = str(tmp_path / "tampered.ndjson")
+    _write(tampered, records)
+    report = replay.replay(tampered, db_url=f"sqlite:///{tmp_path / 'b.db'}")
+    assert report["identical"] is False
+    assert report["trades"]["match"] is False
+    instruments.drop("TST")
+
+
+def test_record_reads_one_snapshot_on_sqlite(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}")
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")  # readers keep their snapshot while others commit
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    db, other = Session(), Session()
+    instruments.load(db)
+    try:
+        assert replay.Replayer(db).run(iter(TAPE))["rejected"] == 0
+
+        # a deposit committed while record is still reading the events
+        tape_record = replay._tape_record
+
+        def deposit_midway(*args):
+            other.query(models.Balance).filter_by(user_id="u1", ticker="RUB").update({"amount": 1})
+            other.commit()
+            return tape_record(*args)
+
+        monkeypatch.setattr(replay, "_tape_record", deposit_midway)
+        tape = str(tmp_path / "tape.ndjson")
+        replay.record(db, tape)
+    finally:
+        db.close()
+        other.close()
+        engine.dispose()
+        instruments.drop("TST")
+
+    [expect] = [rec for rec in replay.read_tape(tape) if rec["op"] == "expect_balances"]
+    assert ["u1", "RUB", 1, 0] not in expect["balances"]
@@ -0,0 +1,68 @@
+from app import bulk, models, reserves
+
+
+def test_check_reports_reserved_drift(session_factory):
+    db = session_factory()
+    a = bulk.provision_users_chunk(db, [{"name": "mm-1"}], 0, 1000)[0]["id"]
+    db.add_all([
+        models.Order(user_id=a, type=models.OrderType.LIMIT, direction=models.Direction.BUY,
+                     ticker="BTC", qty=3, price=100, filled=1, status=models.OrderStatus.NEW),
+        models.Order(user_id=a, type=models.OrderType.LIMIT, direction=models.Direction.SELL,
+                     ticker="BTC", qty=5, price=200, filled=0, status=models.OrderStatus.NEW),
+        models.Order(user_id=a, type=models.OrderType.MARKET, direction=models.Direction.BUY,
+                     ticker="BTC", qty=5, price=None, filled=0, status=models.OrderStatus.NEW),
+    ])
+    db.query(models.Balance).filter(models.Balance.user_id == a).update({"reserved": 200})
+    db.add(models.Balance(user_id=a, ticker="BTC", amount=0, reserved=4))
+    db.commit()
+
+    assert reserves.check(db) == [{"user_id": a, "ticker": "BTC", "reserved": 4, "expected": 5}]
+
+    # cancelling everything releases exactly what was reserved
+    db.query(models.Balance).filter(models.Balance.ticker == "BTC").update({"reserved": 5})
+    bulk.cancel_open_orders(db, "BTC")
+    db.commit()
+    assert reserves.check(db) == []
+    amounts = {b.ticker: (b.amount, b.reserved) for b in db.query(models.Balance)}
+    assert amounts == {"RUB": (1200, 0), "BTC": (5, 0)}
+    db.close()
+
+
+def test_crossing_limit_buy_refunds_price_improvement_and_rests_remainder(market):
+    db = market.db
+    seller, buyer = market.trader("seller", tst=3), market.trader("buyer", rub=1000)
+    market.order(seller, "SELL", 3, 95)
+
+    o = market.order(buyer, "BUY", 5, 100)
+    assert (o.filled, o.status) == (3, models.OrderStatus.NEW)
+    # 500 reserved, 3 x 100 released on fill with 3 x 5 improvement refunded; 2 x 100 stays locked
+    assert market.balances(buyer) == {"RUB": (515, 200), "TST": (3, 0)}
+    assert market.balances(seller) == {"RUB": (285, 0), "TST": (0, 0)}
+    assert reserves.check(db) == []
+
+
+def test_sell_taker_fills_against_resting_bid(market):
+    db = market.db
+    buyer, seller = market.trader("buyer", rub=1000), market.trader("seller", tst=5)
+    bid = market.order(buyer, "BUY", 4, 100)
+
+    o = market.order(seller, "SELL", 3, 90)
+    assert o.status == models.OrderStatus.EXECUTED
+    db.refresh(bid)
+    assert bid.filled == 3
+    # trades at the resting bid's price
+    assert market.balances(buyer) == {"RUB": (600, 100), "TST": (3, 0)}
+    assert market.balances(seller) == {"RUB": (300, 0), "TST": (2, 0)}
+    assert reserves.check(db) == []
+
+
+def test_market_buy_is_capped_by_available_rub(market):
+    db = market.db
+    seller, buyer = market.trader("seller", tst=10), market.trader("buyer", rub=250)
+    market.order(seller, "SELL", 10, 100)
+
+    o = market.order(buyer, "BUY", 5)
+    assert o.filled == 2
+    assert market.balances(buyer) == {"RUB": (50, 0), "TST": (2, 0)}
+    assert market.balances(seller) == {"RUB": (200, 0), "TST": (0, 8)}
+    assert reserves.check(db) == []
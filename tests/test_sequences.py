@@ -0,0 +1,43 @@
+from app import bulk, instruments, models
+from app.routers.order import amend_order, create_order, list_orders
+from app.schemas import AmendOrderBody
+from app.sequences import order_seq, trade_seq
+
+
+def test_sequences_are_per_ticker_and_gap_free(session_factory):
+    db = session_factory()
+    assert [order_seq(db, "BTC") for _ in range(3)] == [1, 2, 3]
+    assert order_seq(db, "ETH") == 1
+    assert trade_seq(db, "BTC") == 1
+    db.commit()
+
+    # a rolled-back acceptance gives its number back
+    assert order_seq(db, "BTC") == 4
+    db.rollback()
+    assert order_seq(db, "BTC") == 4
+    db.commit()
+
+    assert db.get(models.Sequence, "order:BTC").value == 4
+    db.close()
+
+
+def test_order_history_cursor(session_factory):
+    db = session_factory()
+    user_id = bulk.provision_users_chunk(db, [{"name": "trader"}], 0, 10_000)[0]["id"]
+    user = db.get(models.User, user_id)
+    db.add(models.Instrument(ticker="TST", name="Test"))
+    db.commit()
+    instruments.load(db)
+    try:
+        ids = [create_order({"direction": "BUY", "ticker": "TST", "qty": 1, "price": p}, user=user, db=db)["order_id"]
+               for p in (10, 11, 12)]
+        page = list_orders(ticker="TST", after_seq=0, limit=2, user=user, db=db)
+        assert [o["id"] for o in page] == ids[:2]
+        assert [o["id"] for o in list_orders(ticker="TST", after_seq=page[-1]["seq"], user=user, db=db)] == ids[2:]
+
+        # re-pricing moves the order behind everything accepted so far
+        amend_order(AmendOrderBody(price=13), order_id=ids[0], user=user, db=db)
+        assert [o["id"] for o in list_orders(ticker="TST", after_seq=3, user=user, db=db)] == ids[:1]
+    finally:
+        instruments.drop("TST")
+        db.close()
@@ -1,24 +1,10 @@
 import os
-import tempfile
 from fastapi.testclient import TestClient
 
-# point the app to a temporary sqlite file
+# DATABASE_URL and ADMIN_API_KEY are set in conftest.py, before the app is imported
 from app import main as app_main
 
 
-def setup_module(module):
-    # create a temp DB file
-    tmp = tempfile.NamedTemporaryFile(prefix="test_toy_exchange_", delete=False)
-    tmp.close()
-    os.environ["DATABASE_URL"] = f"sqlite:///{tmp.name}"
-    os.environ["ADMIN_API_KEY"] = "test-admin-token"
-
-    # reload modules: app_main already created tables during import;
-    # to be safe we call create_all again
-    from app.database import engine, Base
-    Base.metadata.create_all(bind=engine)
-
-
 def teardown_module(module):
     # remove the temp DB file
     dburl = os.environ.get("DATABASE_URL")
@@ -31,46 +17,54 @@ def teardown_module(module):
 
 
 def test_register_deposit_order_flow():
-    client = TestClient(app_main.app)
+    # the context manager runs the startup hooks (admin user, instrument registry)
+    with TestClient(app_main.app) as client:
+        # register user
+        r = client.post("/api/v1/public/register", json={"name": "bob"})
+        assert r.status_code == 200
+        data = r.json()
+        assert "api_key" in data
+        user_id = data["id"]
+        user_key = data["api_key"]
 
-    # register user
-    r = client.post("/api/v1/public/register", json={"name": "bob"})
-    assert r.status_code == 200
-    data = r.json()
-    assert "api_key" in data
-    user_id = data["id"]
-    user_key = data["api_key"]
+        # deposit as admin
+        r = client.post(
+            "/api/v1/admin/balance/deposit",
+            headers={"Authorization": f"TOKEN {os.environ['ADMIN_API_KEY']}"},
+            json={"user_id": user_id, "ticker": "BTC", "amount": 10},
+        )
+        assert r.status_code == 200
+        assert r.json().get("success") is True
 
-    # deposit as admin
-    r = client.post(
-        "/api/v1/admin/balance/deposit",
-        headers={"Authorization": f"TOKEN {os.environ['ADMIN_API_KEY']}"},
-        json={"user_id": user_id, "ticker": "BTC", "amount": 10},
-    )
-    assert r.status_code == 200
-    assert r.json().get("success") is True
+        # list the instrument so orders on it are accepted
+        r = client.post(
+            "/api/v1/admin/instrument",
+            headers={"Authorization": f"TOKEN {os.environ['ADMIN_API_KEY']}"},
+            json={"ticker": "BTC", "name": "Bitcoin"},
+        )
+        assert r.status_code == 200
 
-    # place a limit buy
-    r = client.post(
-        "/api/v1/order",
-        headers={"Authorization": f"TOKEN {user_key}"},
-        json={"direction": "BUY", "ticker": "BTC", "qty": 1, "price": 100},
-    )
-    assert r.status_code == 200
-    oid = r.json().get("order_id")
-    assert oid
+        # place a limit buy
+        r = client.post(
+            "/api/v1/order",
+            headers={"Authorization": f"TOKEN {user_key}"},
+            json={"direction": "BUY", "ticker": "BTC", "qty": 1, "price": 100},
+        )
+        assert r.status_code == 200
+        oid = r.json().get("order_id")
+        assert oid
 
-    # place a market sell to match
-    r = client.post(
-        "/api/v1/order",
-        headers={"Authorization": f"TOKEN {user_key}"},
-        json={"direction": "SELL", "ticker": "BTC", "qty": 1},
-    )
-    assert r.status_code == 200
+        # place a market sell to match
+        r = client.post(
+            "/api/v1/order",
+            headers={"Authorization": f"TOKEN {user_key}"},
+            json={"direction": "SELL", "ticker": "BTC", "qty": 1},
+        )
+        assert r.status_code == 200
 
-    # check transactions
-    r = client.get("/api/v1/public/transactions/BTC")
-    assert r.status_code == 200
-    txs = r.json()
-    assert isinstance(txs, list)
-    assert len(txs) >= 1
+        # check transactions
+        r = client.get("/api/v1/public/transactions/BTC")
+        assert r.status_code == 200
+        txs = r.json()
+        assert isinstance(txs, list)
+        assert len(txs) >= 1